@@ -1,39 +1,481 @@
-import os, random, asyncio, aiohttp, json, discord
-from dataclasses import dataclass
+import os, re, sys, time, uuid, queue, random, asyncio, aiohttp, json
+import logging, sqlite3, contextvars, discord, itertools, threading, zlib
+import multiprocessing
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from discord.ext import commands, tasks
+from logging.handlers import QueueHandler, QueueListener
+from types import SimpleNamespace
 from typing import Optional
+from urllib.parse import urlsplit
 
 
-@dataclass
+log = logging.getLogger("localbot")
+# Set per mention in on_message/chat; asyncio tasks inherit it, so tool calls
+# and model calls made for that mention log the same id.
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        current_request = request_id.get()
+        if current_request:
+            entry["request_id"] = current_request
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Drops a share of records logged with a ``sample`` rate below 1."""
+
+    def filter(self, record):
+        rate = getattr(record, "sample", None)
+        return rate is None or random.random() < rate
+
+
+def configure_logging(level: str = "INFO") -> QueueListener:
+    """Route ``log`` through a queue to a background writer thread.
+
+    Records are sampled and formatted as JSON in the caller (so the request
+    id is read in the right context) and written to stdout by the listener,
+    so a slow stdout never blocks the event loop.
+    """
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.setFormatter(JsonFormatter())
+    queue_handler.addFilter(SamplingFilter())
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(records, stream_handler)
+    log.handlers[:] = [queue_handler]
+    log.setLevel(level)
+    log.propagate = False
+    listener.start()
+    return listener
+
+
+def log_event(level: int, event: str, sample: Optional[float] = None, **fields):
+    """Log ``event`` with structured ``fields``; ``sample`` keeps that share of lines."""
+    if log.isEnabledFor(level):
+        log.log(level, event, extra={"fields": fields, "sample": sample})
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token plus per-message overhead)."""
+    return len(text) // 4 + 4
+
+
+@dataclass(slots=True)
 class _ChatMessage:
     content: str
     type: str
+    tokens: int = 0
+    payload: dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.tokens:
+            self.tokens = estimate_tokens(self.content)
+        role = "user" if self.type == "human" else "assistant"
+        self.payload = {"role": role, "content": self.content}
 
 
 class _ChatMemory:
-    def __init__(self, k: int = 5):
+    """Recent messages for one context.
+
+    By default the last ``k`` exchanges are kept. With ``token_budget`` set,
+    as many recent messages as fit the budget are kept instead (up to
+    ``max_messages``), and with ``summarize`` the dropped ones are folded
+    into a short extractive ``summary``.
+
+    ``prompt`` is the ready-to-send message list (system message, summary,
+    history) and is updated in place as messages are added and trimmed.
+    """
+
+    def __init__(
+        self,
+        k: int = 5,
+        key: Optional[str] = None,
+        backend=None,
+        token_budget: Optional[int] = None,
+        summarize: bool = False,
+        max_messages: Optional[int] = None,
+        system_message: Optional[dict] = None,
+    ):
         self.messages: list = []
+        self.summary: str = ""
+        self._system_message = system_message
+        self.prompt: list = self._prompt_head()
         self._k = k
+        self._key = key
+        self._backend = backend
+        self._token_budget = token_budget
+        self._summarize = summarize
+        self.max_messages = max_messages or k * 2
+        self._tokens = 0
 
     def add_user_message(self, content: str):
-        self.messages.append(_ChatMessage(content=content, type="human"))
-        self._trim()
+        self._add(content, "human")
 
     def add_ai_message(self, content: str):
-        self.messages.append(_ChatMessage(content=content, type="ai"))
+        self._add(content, "ai")
+
+    def _add(self, content: str, type: str):
+        message = _ChatMessage(content=content, type=type)
+        self.messages.append(message)
+        self.prompt.append(message.payload)
+        self._tokens += message.tokens
+        if self._backend is not None:
+            self._backend.record(self._key, type, content)
+        self._trim()
+
+    def restore(self, rows: list):
+        """Load persisted ``(type, content)`` rows without writing them back."""
+        self.messages = [_ChatMessage(content=c, type=t) for t, c in rows]
+        self._tokens = sum(m.tokens for m in self.messages)
+        self.prompt = self._prompt_head() + [m.payload for m in self.messages]
         self._trim()
 
+    def _prompt_head(self) -> list:
+        head = [self._system_message] if self._system_message else []
+        if self.summary:
+            head.append(
+                {
+                    "role": "system",
+                    "content": "Summary of earlier conversation:\n" + self.summary,
+                }
+            )
+        return head
+
     def _trim(self):
-        max_messages = self._k * 2
-        if len(self.messages) > max_messages:
-            self.messages = self.messages[-max_messages:]
+        drop = max(0, len(self.messages) - self.max_messages)
+        if self._token_budget:
+            tokens = self._tokens - sum(m.tokens for m in self.messages[:drop])
+            # Always keep the newest message, even if it alone is over budget.
+            while tokens > self._token_budget and drop < len(self.messages) - 1:
+                tokens -= self.messages[drop].tokens
+                drop += 1
+        if drop:
+            dropped = self.messages[:drop]
+            del self.messages[:drop]
+            self._tokens -= sum(m.tokens for m in dropped)
+            if self._summarize:
+                self._fold_into_summary(dropped)
+                self.prompt = self._prompt_head() + [m.payload for m in self.messages]
+            else:
+                head = len(self.prompt) - len(self.messages) - drop
+                del self.prompt[head : head + drop]
+
+    def _fold_into_summary(self, dropped: list):
+        lines = self.summary.splitlines() if self.summary else []
+        for message in dropped:
+            first_sentence = re.split(r"(?<=[.!?])\s", message.content.strip(), 1)[0]
+            speaker = "User" if message.type == "human" else "Bot"
+            lines.append(f"- {speaker}: {first_sentence[:200]}")
+        # The summary gets a quarter of the budget; the oldest points go first.
+        summary_budget = (self._token_budget or 1000) // 4
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > summary_budget:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
 
 
 class ConversationBufferWindowMemory:
-    def __init__(self, return_messages: bool = True, k: int = 5):
-        self.chat_memory = _ChatMemory(k=k)
+    def __init__(
+        self,
+        return_messages: bool = True,
+        k: int = 5,
+        key: Optional[str] = None,
+        backend=None,
+        token_budget: Optional[int] = None,
+        summarize: bool = False,
+        max_messages: Optional[int] = None,
+        system_message: Optional[dict] = None,
+    ):
+        self.chat_memory = _ChatMemory(
+            k=k,
+            key=key,
+            backend=backend,
+            token_budget=token_budget,
+            summarize=summarize,
+            max_messages=max_messages,
+            system_message=system_message,
+        )
+
+
+class MemoryBackend:
+    """Persistence hook for chat memory. The base class stores nothing."""
+
+    def record(self, key: str, type: str, content: str):
+        """Queue one message for writing; must not block."""
+
+    async def load(self, key: str, limit: int) -> list:
+        """Return up to ``limit`` most recent ``(type, content)`` rows, oldest first."""
+        return []
+
+    async def flush(self):
+        pass
+
+    async def clear(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """Append-only SQLite log of chat messages in WAL mode.
+
+    ``record`` only buffers in memory; ``flush`` writes the batch in a worker
+    thread and prunes each touched context down to ``retain`` rows.
+    """
+
+    def __init__(self, path: str, retain: int = 10):
+        self.path = path
+        self.retain = retain
+        self._pending: list = []
+        self._lock = asyncio.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "context_key TEXT NOT NULL, type TEXT NOT NULL, content TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS messages_context "
+                "ON messages (context_key, id)"
+            )
+        return self._db
+
+    def record(self, key: str, type: str, content: str):
+        self._pending.append((key, type, content))
+
+    def _write(self, batch: list):
+        db = self._connect()
+        with db:
+            db.executemany(
+                "INSERT INTO messages (context_key, type, content) VALUES (?, ?, ?)",
+                batch,
+            )
+            for key in {row[0] for row in batch}:
+                db.execute(
+                    "DELETE FROM messages WHERE context_key = ? AND id <= ("
+                    "SELECT id FROM messages WHERE context_key = ? "
+                    "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (key, key, self.retain),
+                )
+
+    def _read(self, key: str, limit: int) -> list:
+        rows = (
+            self._connect()
+            .execute(
+                "SELECT type, content FROM messages WHERE context_key = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (key, limit),
+            )
+            .fetchall()
+        )
+        return rows[::-1]
+
+    def _delete_all(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM messages")
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        async with self._lock:
+            await asyncio.to_thread(self._write, batch)
+
+    async def load(self, key: str, limit: int) -> list:
+        # Anything still buffered for this context has to land first.
+        await self.flush()
+        async with self._lock:
+            return await asyncio.to_thread(self._read, key, limit)
+
+    async def clear(self):
+        self._pending.clear()
+        async with self._lock:
+            await asyncio.to_thread(self._delete_all)
+
+    async def close(self):
+        await self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class ConversationStore:
+    """Per-context conversation memories, bounded by count and idle time.
+
+    Contexts are kept in least-recently-used order: touching one moves it to
+    the end, going over ``max_entries`` evicts from the front, and ``sweep``
+    drops every context idle for longer than ``idle_ttl`` seconds.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        idle_ttl: float = 6 * 3600,
+        backend: Optional[MemoryBackend] = None,
+        k: int = 5,
+        token_budget: Optional[int] = None,
+        summarize: bool = False,
+        max_messages: Optional[int] = None,
+        system_message: Optional[dict] = None,
+    ):
+        self.k = k
+        self.system_message = system_message
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.max_messages = max_messages or k * 2
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.backend = backend or MemoryBackend()
+        self._entries: OrderedDict = OrderedDict()
+        self._last_used: dict = {}
+        self._loading: dict = {}
+        self.stats = {"evicted_lru": 0, "expired_idle": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key: str) -> ConversationBufferWindowMemory:
+        """Return the memory for ``key``, creating it if needed."""
+        memory = self._entries.get(key)
+        if memory is None:
+            memory = ConversationBufferWindowMemory(
+                return_messages=True,
+                k=self.k,
+                key=key,
+                backend=self.backend,
+                token_budget=self.token_budget,
+                summarize=self.summarize,
+                max_messages=self.max_messages,
+                system_message=self.system_message,
+            )
+            self._entries[key] = memory
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                del self._last_used[evicted]
+                self.stats["evicted_lru"] += 1
+        else:
+            self._entries.move_to_end(key)
+        self._last_used[key] = time.monotonic()
+        return memory
+
+    async def acquire(self, key: str) -> ConversationBufferWindowMemory:
+        """Like ``get``, but restores a context from the backend on first touch."""
+        if key in self._entries:
+            return self.get(key)
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = asyncio.ensure_future(self.backend.load(key, self.max_messages))
+            self._loading[key] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(key, None))
+        try:
+            rows = await asyncio.shield(loading)
+        except Exception as e:
+            log_event(logging.WARNING, "memory_restore_failed", context=key, error=str(e))
+            rows = []
+        memory = self.get(key)
+        if rows and not memory.chat_memory.messages:
+            memory.chat_memory.restore(rows)
+        return memory
+
+    def sweep(self) -> int:
+        """Drop contexts idle past ``idle_ttl``; returns how many were removed."""
+        cutoff = time.monotonic() - self.idle_ttl
+        removed = 0
+        for key in list(self._entries):
+            if self._last_used[key] > cutoff:
+                break
+            del self._entries[key]
+            del self._last_used[key]
+            removed += 1
+        self.stats["expired_idle"] += removed
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+        self._last_used.clear()
+
+    async def reset(self):
+        """Forget every context, including what the backend has persisted."""
+        self.clear()
+        await self.backend.clear()
+
+
+class ShardedConversationStore:
+    """ConversationStores partitioned by gateway shard.
+
+    Each shard gets its own store, and so its own LRU bound, so a busy shard
+    can't evict another shard's contexts. ``shard_of`` maps a context key to
+    its shard. All partitions share one persistence backend.
+    """
+
+    def __init__(self, shard_of, **options):
+        self._shard_of = shard_of
+        self.backend = options.pop("backend", None) or MemoryBackend()
+        self._options = options
+        self.partitions: dict = {}
+
+    def partition(self, key: str) -> ConversationStore:
+        shard = self._shard_of(key)
+        store = self.partitions.get(shard)
+        if store is None:
+            store = self.partitions[shard] = ConversationStore(
+                backend=self.backend, **self._options
+            )
+        return store
+
+    def __len__(self):
+        return sum(len(store) for store in self.partitions.values())
+
+    def __contains__(self, key):
+        return key in self.partition(key)
+
+    @property
+    def stats(self) -> dict:
+        totals = {"evicted_lru": 0, "expired_idle": 0}
+        for store in self.partitions.values():
+            for name, value in store.stats.items():
+                totals[name] += value
+        return totals
+
+    def get(self, key: str) -> ConversationBufferWindowMemory:
+        return self.partition(key).get(key)
+
+    async def acquire(self, key: str) -> ConversationBufferWindowMemory:
+        return await self.partition(key).acquire(key)
+
+    def sweep(self) -> int:
+        return sum(store.sweep() for store in self.partitions.values())
+
+    def clear(self):
+        for store in self.partitions.values():
+            store.clear()
+
+    async def reset(self):
+        self.clear()
+        await self.backend.clear()
 
-from groq import Groq
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -41,20 +483,432 @@ TOKEN = os.getenv("TOKEN")
 WOLF = os.getenv("WOLF")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "32"))
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+# Sends every tool request to ``<override>/<original host>/<path>`` instead,
+# e.g. a local mock server for offline replays (see benchmarks/replay.py).
+HTTP_UPSTREAM_OVERRIDE = os.getenv("HTTP_UPSTREAM_OVERRIDE", "").rstrip("/")
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+MODELS = ["openai/gpt-oss-120b", "openai/gpt-oss-20b"]
+MODEL_FAILURE_THRESHOLD = int(os.getenv("MODEL_FAILURE_THRESHOLD", "3"))
+MODEL_OPEN_SECONDS = float(os.getenv("MODEL_OPEN_SECONDS", "30"))
+MODEL_SLOW_P95 = float(os.getenv("MODEL_SLOW_P95", "0"))
+MODEL_HEDGE_AFTER = float(os.getenv("MODEL_HEDGE_AFTER", "0"))
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "16"))
+CHAT_MAX_PER_GUILD = int(os.getenv("CHAT_MAX_PER_GUILD", "2"))
+CHAT_MAX_QUEUE_PER_GUILD = int(os.getenv("CHAT_MAX_QUEUE_PER_GUILD", "5"))
+# Rate limits are "<requests>/<seconds>"; the burst size equals <requests>.
+RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "6/60")
+RATE_LIMIT_GUILD = os.getenv("RATE_LIMIT_GUILD", "30/60")
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+# Message deletes per channel (a bulk delete takes one token). py-cord also
+# waits on Discord's rate-limit headers; this keeps long clears off 429s.
+RATE_LIMIT_DELETE = os.getenv("RATE_LIMIT_DELETE", "5/1")
+DELETE_SCAN_LIMIT = int(os.getenv("DELETE_SCAN_LIMIT", "1000"))
+UPSTREAM_RATE_LIMITS = {
+    "api.groq.com": os.getenv("RATE_LIMIT_GROQ", "30/60"),
+    "www.wolframalpha.com": os.getenv("RATE_LIMIT_WOLFRAM", "60/60"),
+    "api.openweathermap.org": os.getenv("RATE_LIMIT_WEATHER", "60/60"),
+    "api.coingecko.com": os.getenv("RATE_LIMIT_COINGECKO", "20/60"),
+    "www.reddit.com": os.getenv("RATE_LIMIT_REDDIT", "10/60"),
+    "api.thecatapi.com": os.getenv("RATE_LIMIT_CATAPI", "60/60"),
+    "api.thedogapi.com": os.getenv("RATE_LIMIT_DOGAPI", "60/60"),
+}
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+# "all" sends every tool schema; "keyword" sends only those the prompt needs.
+TOOL_SELECTION = os.getenv("TOOL_SELECTION", "all").lower()
+# "full" is the original system prompt; "compact" is a short rewrite of it.
+SYSTEM_PROMPT_VARIANT = os.getenv("SYSTEM_PROMPT_VARIANT", "full").lower()
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+WEATHER_TTL = float(os.getenv("WEATHER_TTL", "600"))
+CRYPTO_TTL = float(os.getenv("CRYPTO_TTL", "60"))
+WOLFRAM_TTL = float(os.getenv("WOLFRAM_TTL", "3600"))
+WOLFRAM_MATH_TTL = float(os.getenv("WOLFRAM_MATH_TTL", "604800"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Reuse answers to repeated context-free prompts ("what can you do?").
+CHAT_CACHE = os.getenv("CHAT_CACHE", "").lower() in ("1", "true", "yes")
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1024"))
+# Trigram Jaccard similarity needed for a near-match; 1 (the default) means
+# exact normalized matches only.
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "1"))
+COIN_INDEX_REFRESH_HOURS = float(os.getenv("COIN_INDEX_REFRESH_HOURS", "24"))
+# Price lookups arriving within this window share one simple/price request.
+COIN_BATCH_WINDOW = float(os.getenv("COIN_BATCH_WINDOW", "0.05"))
+MEME_REFRESH_MINUTES = float(os.getenv("MEME_REFRESH_MINUTES", "15"))
+MEME_POOL_SIZE = int(os.getenv("MEME_POOL_SIZE", "100"))
+MEMORY_MAX_CONTEXTS = int(os.getenv("MEMORY_MAX_CONTEXTS", "10000"))
+MEMORY_IDLE_TTL = float(os.getenv("MEMORY_IDLE_TTL", str(6 * 3600)))
+MEMORY_SWEEP_MINUTES = float(os.getenv("MEMORY_SWEEP_MINUTES", "10"))
+MEMORY_DB = os.getenv("MEMORY_DB")
+MEMORY_FLUSH_SECONDS = float(os.getenv("MEMORY_FLUSH_SECONDS", "2"))
+# 0 keeps the fixed five-exchange window; otherwise keep what fits the budget.
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "0"))
+MEMORY_MAX_MESSAGES = int(os.getenv("MEMORY_MAX_MESSAGES", "50"))
+MEMORY_SUMMARIZE = os.getenv("MEMORY_SUMMARIZE", "").lower() in ("1", "true", "yes")
+# Sharding: AUTO_SHARD=1 lets Discord pick the shard count; SHARD_COUNT fixes
+# it, and SHARD_IDS ("0-3" or "0,2,4") picks the shards this process runs.
+AUTO_SHARD = os.getenv("AUTO_SHARD", "").lower() in ("1", "true", "yes")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = os.getenv("SHARD_IDS")
+# Seconds py-cord waits after the last GUILD_CREATE before firing on_ready.
+GUILD_READY_TIMEOUT = float(os.getenv("GUILD_READY_TIMEOUT", "2"))
+# Run chat orchestration in this many worker processes (0 keeps it in-process).
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_TOOL_SAMPLE_RATE = float(os.getenv("LOG_TOOL_SAMPLE_RATE", "0.1"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # unset/0: no endpoint
+
+log_listener = configure_logging(LOG_LEVEL)
+
+
+def checked_choice(name: str, value: str, choices: tuple) -> str:
+    """``value`` if it is one of ``choices``, else the default (the first)."""
+    if value in choices:
+        return value
+    log_event(
+        logging.WARNING, "invalid_setting", setting=name, value=value, using=choices[0]
+    )
+    return choices[0]
+
+
+# An unknown value would otherwise fail every chat request, not the import.
+TOOL_SELECTION = checked_choice("TOOL_SELECTION", TOOL_SELECTION, ("all", "keyword"))
+SYSTEM_PROMPT_VARIANT = checked_choice(
+    "SYSTEM_PROMPT_VARIANT", SYSTEM_PROMPT_VARIANT, ("full", "compact")
+)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: dict = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+
+class Histogram:
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values: dict = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", labels + (("le", bound),), bucket_count
+            yield f"{self.name}_bucket", labels + (("le", "+Inf"),), count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Collected:
+    """Values read from a callback at scrape time.
+
+    ``collect`` returns either a number or a ``{label_value: number}`` dict,
+    which is exported with ``label`` as the label name.
+    """
+
+    def __init__(self, name: str, help: str, collect, type: str = "gauge", label=None):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.collect = collect
+        self.label = label
+
+    def samples(self):
+        value = self.collect()
+        if isinstance(value, dict):
+            for label_value, number in value.items():
+                yield self.name, ((self.label, label_value),), number
+        else:
+            yield self.name, (), value
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format.
+
+    The gateway keeps each worker's latest ``snapshot`` in ``remote`` and
+    adds it in, so counters and histograms cover every process.
+    """
+
+    def __init__(self):
+        self.metrics: list = []
+        self.remote: dict = {}
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._add(Counter(name, help))
+
+    def histogram(self, name: str, help: str, **kwargs) -> Histogram:
+        return self._add(Histogram(name, help, **kwargs))
+
+    def collected(self, name: str, help: str, collect, **kwargs) -> Collected:
+        return self._add(Collected(name, help, collect, **kwargs))
+
+    def _merged(self, metric) -> dict:
+        samples = {(name, labels): value for name, labels, value in metric.samples()}
+        for snapshot in self.remote.values():
+            for name, labels, value in snapshot.get(metric.name, ()):
+                samples[name, labels] = samples.get((name, labels), 0) + value
+        return samples
+
+    def snapshot(self) -> dict:
+        """This process's samples by metric name, to send to the gateway."""
+        snapshot = {}
+        for metric in self.metrics:
+            try:
+                snapshot[metric.name] = list(metric.samples())
+            except Exception:
+                continue
+        return snapshot
+
+    def totals(self, name: str, label: Optional[str] = None) -> dict:
+        """Merged values of metric ``name``, keyed by their ``label`` value."""
+        for metric in self.metrics:
+            if metric.name == name:
+                return {
+                    dict(labels).get(label): value
+                    for (sample, labels), value in self._merged(metric).items()
+                    if sample == name
+                }
+        return {}
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                for (name, labels), value in self._merged(metric).items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            except Exception as e:
+                log_event(
+                    logging.WARNING,
+                    "metric_collect_failed",
+                    metric=metric.name,
+                    error=str(e),
+                )
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+completion_seconds = metrics.histogram(
+    "localbot_completion_seconds", "Model completion latency by model and outcome."
+)
+tool_seconds = metrics.histogram(
+    "localbot_tool_seconds", "Tool execution latency by tool."
+)
+tool_use_depth_rounds = metrics.histogram(
+    "localbot_tool_use_depth",
+    "Tool-calling rounds needed per chat response.",
+    buckets=(0, 1, 2, 3, 4, 5),
+)
+http_responses = metrics.counter(
+    "localbot_http_responses_total", "Upstream HTTP responses by host and status."
+)
+discord_send_seconds = metrics.histogram(
+    "localbot_discord_send_seconds", "Latency of sending messages to Discord."
+)
+deleted_messages = metrics.counter(
+    "localbot_deleted_messages_total", "Messages deleted by clear/purge, by method."
+)
+
+
+class MetricsServer:
+    """Serves ``registry`` at ``/metrics`` on a small aiohttp web app."""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        return web.Response(
+            text=self.registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def start(self):
+        if not self.port or self._runner is not None:
+            return
+        # aiohttp.web is only needed once the endpoint is actually served.
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # A taken port shouldn't keep the bot itself from starting.
+            log_event(
+                logging.ERROR, "metrics_bind_failed", port=self.port, error=str(e)
+            )
+            await self.stop()
+            return
+        log_event(logging.INFO, "metrics_serving", host=self.host, port=self.port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-# Python 3.14 removed implicit event loop creation in asyncio.get_event_loop().
-# py-cord 2.6.1 still relies on it during Bot.__init__, so we create one explicitly.
-try:
-    asyncio.get_running_loop()
-except RuntimeError:
-    asyncio.set_event_loop(asyncio.new_event_loop())
 
-bot = commands.Bot(command_prefix="$", intents=intents)
+def parse_shard_ids(spec: Optional[str]) -> Optional[list]:
+    """Parse ``"0-3"`` / ``"0,2,4"`` (or a mix) into a list of shard ids."""
+    if not spec:
+        return None
+    shard_ids = []
+    for part in spec.split(","):
+        start, _, end = part.strip().partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_ids
+
+
+class LocalBotMixin:
+    async def start(self, *args, **kwargs):
+        await metrics_server.start()
+        if worker_pool:
+            worker_pool.start()
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        await metrics_server.stop()
+        if worker_pool:
+            await worker_pool.stop()
+        await conversation_memory.backend.close()
+        await http_client.close()
+        await close_groq_client()
+        await super().close()
+        log_listener.stop()
+
+    async def on_ready(self):
+        log_event(
+            logging.INFO, "ready", user=str(self.user), guilds=len(self.guilds)
+        )
+        if not change_status.is_running():
+            change_status.start(self)
+        if not sweep_conversations.is_running():
+            sweep_conversations.start()
+        if not flush_conversations.is_running():
+            flush_conversations.start()
+        if not refresh_memes.is_running():
+            refresh_memes.start()
+        if not refresh_coin_index.is_running():
+            refresh_coin_index.start()
+        # Build the Groq client off the ready path but before the first chat.
+        await asyncio.to_thread(get_groq_client)
+
+    async def on_message(self, message):
+        shard_events.inc(shard=message.guild.shard_id if message.guild else 0)
+        if self.user and self.user.mentioned_in(message) and not message.author.bot:
+            request_id.set(uuid.uuid4().hex[:12])
+            ctx = await self.get_context(message)
+            await chat(
+                ctx,
+                message=message.content.replace(f"<@{self.user.id}>", "").strip(),
+            )
+        else:
+            await self.process_commands(message)
+
+
+class LocalBotClient(LocalBotMixin, commands.Bot):
+    pass
+
+
+class ShardedLocalBotClient(LocalBotMixin, commands.AutoShardedBot):
+    pass
+
+
+# The running client, set by create_bot(); helpers that have no ctx read it.
+bot: Optional[commands.Bot] = None
+
+
+def shard_for(guild_id) -> int:
+    """Shard that owns ``guild_id``; DMs always arrive on shard 0."""
+    if not guild_id:
+        return 0
+    return (int(guild_id) >> 22) % ((bot and bot.shard_count) or 1)
+
+
+def shard_for_context(context_key: str) -> int:
+    return 0 if context_key.startswith("DM-") else shard_for(context_key)
+
+
+def shard_latencies() -> dict:
+    if bot is None:
+        return {}
+    if isinstance(bot, commands.AutoShardedBot):
+        return dict(bot.latencies)
+    return {0: bot.latency}
+
+
+shard_events = metrics.counter(
+    "localbot_shard_messages_total", "Messages received, by gateway shard."
+)
+metrics.collected(
+    "localbot_shard_latency_seconds",
+    "Gateway heartbeat latency, by shard.",
+    shard_latencies,
+    label="shard",
+)
 
-conversation_memory = {}
 system_prompt = """
 # LocalBot System Instructions
 
@@ -115,326 +969,1307 @@ The following tools are available to you. You should use them whenever necessary
 - Maintain conversation context per server/DM
 """
 
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "calculate",
-            "description": "Perform mathematical calculations or factual queries using Wolfram Alpha.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "The math query or factual question.",
-                    }
-                },
-                "required": ["query"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "weather",
-            "description": "Get current weather statistics for a specific city.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "city": {"type": "string", "description": "The name of the city."}
-                },
-                "required": ["city"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
+compact_system_prompt = """You are LocalBot, a friendly and concise Discord bot. Use emojis sparingly.
+Messages arrive as "username: message". Answer the message only: never start with a name, prefix or label such as "LocalBot:".
+Format for Discord and put image URLs on their own line."""
+
+compact_tool_guidance = """
+Call a tool whenever it gives a more accurate answer; facts, math and conversions go to calculate. If a tool fails, say so plainly and suggest an alternative."""
+
+SYSTEM_MESSAGE = {"role": "system", "content": system_prompt}
+# (variant, tools attached) -> system message. Without tools the full prompt
+# drops its tool list, which would only invite calls the request can't make.
+SYSTEM_MESSAGES = {
+    ("full", True): SYSTEM_MESSAGE,
+    ("full", False): {
+        "role": "system",
+        "content": re.sub(
+            r"## Available Tools\n.*?(?=\n## )", "", system_prompt, flags=re.DOTALL
+        ),
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "cat",
-            "description": "Get a random picture of a cat.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
+    ("compact", True): {
+        "role": "system",
+        "content": compact_system_prompt + compact_tool_guidance,
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "dog",
-            "description": "Get a random picture of a dog.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "meme",
-            "description": "Get a random meme from Reddit.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "gtn",
-            "description": "Start a number guessing game (1-10).",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "dice",
-            "description": "Roll a dice with a specified number of sides.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "sides": {
-                        "type": "integer",
-                        "description": "Number of sides (default 6).",
-                    }
-                },
-                "required": ["sides"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "flip",
-            "description": "Flip a coin.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "ask",
-            "description": "Ask a yes/no question.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "question": {
-                        "type": "string",
-                        "description": "The question to ask.",
-                    }
-                },
-                "required": ["question"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "crypto",
-            "description": "Get the current price for a cryptocurrency.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "symbol": {
-                        "type": "string",
-                        "description": "The crypto symbol (e.g. BTC, ETH).",
-                    }
-                },
-                "required": ["symbol"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "purge",
-            "description": "Delete a specified number of messages.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "amount": {
-                        "type": "integer",
-                        "description": "Number of messages to delete.",
-                    }
-                },
-                "required": ["amount"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "serverinfo",
-            "description": "Get information about the current server.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "userinfo",
-            "description": "Get information about a user.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "user": {
-                        "type": "string",
-                        "description": "The user mention or ID (optional).",
-                    }
+    ("compact", False): {"role": "system", "content": compact_system_prompt},
+}
+
+# Persistence is opt-in: without MEMORY_DB, context is lost on restart.
+_memory_window = MEMORY_MAX_MESSAGES if MEMORY_TOKEN_BUDGET else None
+conversation_memory = ShardedConversationStore(
+    shard_for_context,
+    max_entries=MEMORY_MAX_CONTEXTS,
+    idle_ttl=MEMORY_IDLE_TTL,
+    backend=(
+        SQLiteMemoryBackend(MEMORY_DB, retain=_memory_window or 10)
+        if MEMORY_DB
+        else None
+    ),
+    token_budget=MEMORY_TOKEN_BUDGET or None,
+    summarize=MEMORY_SUMMARIZE,
+    max_messages=_memory_window,
+    system_message=SYSTEM_MESSAGE,
+)
+
+class ToolArgumentError(ValueError):
+    """Raised when a tool call's arguments don't match the tool's parameters."""
+
+
+_REQUIRED = object()
+
+
+@dataclass(slots=True)
+class ToolParam:
+    type: type
+    description: str
+    default: object = _REQUIRED
+    minimum: Optional[int] = None
+    maximum: Optional[int] = None
+
+    def coerce(self, tool: str, name: str, value):
+        if value is None or value == "":
+            if self.default is _REQUIRED:
+                raise ToolArgumentError(f"{tool}: missing '{name}'")
+            return self.default
+        if self.type is int:
+            if isinstance(value, bool):
+                raise ToolArgumentError(f"{tool}: '{name}' must be an integer")
+            try:
+                value = int(value.strip()) if isinstance(value, str) else int(value)
+            except (TypeError, ValueError):
+                raise ToolArgumentError(f"{tool}: '{name}' must be an integer")
+            if self.minimum is not None:
+                value = max(self.minimum, value)
+            if self.maximum is not None:
+                value = min(self.maximum, value)
+            return value
+        return value if isinstance(value, str) else str(value)
+
+
+@dataclass(slots=True)
+class Tool:
+    """A model-callable tool: its handler, parameters and how to run it.
+
+    ``side_effect`` tools run alone, never beside other calls from the same
+    turn; ``gateway`` tools need the gateway's Discord state or prefetched
+    data, so workers hand them to the gateway; ``cacheable`` tools return
+    the same result for any caller at any time; ``rate_bucket`` is the
+    upstream host whose rate limit the tool spends. ``keywords`` is a regex
+    that marks a prompt as needing the tool (see ``select_tools``).
+    """
+
+    name: str
+    description: str
+    handler: object
+    params: dict
+    timeout: float = TOOL_TIMEOUT
+    side_effect: bool = False
+    gateway: bool = False
+    cacheable: bool = False
+    rate_bucket: Optional[str] = None
+    keywords: Optional[str] = None
+    schema: dict = field(init=False)
+
+    def __post_init__(self):
+        type_names = {int: "integer", str: "string"}
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        name: {
+                            "type": type_names[param.type],
+                            "description": param.description,
+                        }
+                        for name, param in self.params.items()
+                    },
+                    "required": list(self.params),
+                    "additionalProperties": False,
                 },
-                "required": ["user"],
-                "additionalProperties": False,
+                "strict": True,
             },
-            "strict": True,
-        },
-    },
+        }
+        if not self.params:
+            del self.schema["function"]["parameters"]["required"]
+
+    def parse(self, raw: Optional[str]) -> dict:
+        """Decode and validate the model's JSON arguments into handler kwargs."""
+        try:
+            arguments = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            raise ToolArgumentError(f"{self.name}: arguments are not valid JSON")
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f"{self.name}: arguments must be an object")
+        unknown = arguments.keys() - self.params.keys()
+        if unknown:
+            raise ToolArgumentError(
+                f"{self.name}: unexpected argument(s) {', '.join(sorted(unknown))}"
+            )
+        return {
+            name: param.coerce(self.name, name, arguments.get(name))
+            for name, param in self.params.items()
+        }
+
+
+class ToolRegistry:
+    """Tools declared with ``@tool`` next to their handlers.
+
+    Each registration builds the tool's JSON schema once and appends it to
+    ``schemas``, the list sent to the model as ``TOOLS``.
+    """
+
+    def __init__(self):
+        self.tools: dict = {}
+        self.schemas: list = []
+        self._matcher = None
+
+    def register(self, name: str, description: str, params: Optional[dict] = None, **options):
+        def decorator(handler):
+            tool = Tool(name, description, handler, params or {}, **options)
+            self.tools[name] = tool
+            self.schemas.append(tool.schema)
+            self._matcher = None
+            return handler
+
+        return decorator
+
+    def select(self, *texts: str) -> list:
+        """Schemas of the tools whose keywords occur in any of ``texts``.
+
+        Keyword patterns are compiled once, on first use after a tool is
+        registered. A capability question selects every tool.
+        """
+        if self._matcher is None:
+            self._matcher = [
+                (tool, re.compile(tool.keywords, re.IGNORECASE))
+                for tool in self.tools.values()
+                if tool.keywords
+            ]
+        if any(_CAPABILITY_QUESTION.search(text) for text in texts):
+            return self.schemas
+        text = "\n".join(texts)
+        return [tool.schema for tool, pattern in self._matcher if pattern.search(text)]
+
+    def get(self, name: str) -> Tool:
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return tool
+
+    def all_cacheable(self, names) -> bool:
+        return all(name in self.tools and self.tools[name].cacheable for name in names)
+
+
+# "What can you do?" needs every tool (and the full tool list) to answer. A
+# bare "help" counts only as the whole prompt, not "can you help me ...".
+_CAPABILITY_QUESTION = re.compile(
+    r"\b(?:what (?:else )?can you do|what do you do"
+    r"|(?:what|which) (?:commands|features|capabilities|tools) (?:do|can) you"
+    r"|(?:list|show me) (?:your|the|all) (?:commands|features|tools)"
+    r"|your (?:commands|features|capabilities|tools))\b"
+    r"|\A\W*(?:help|commands|features|capabilities|tools)\W*\Z",
+    re.IGNORECASE,
+)
+
+tool_registry = ToolRegistry()
+tool = tool_registry.register
+TOOLS = tool_registry.schemas
+
+
+class RateLimited(Exception):
+    """Raised when an upstream bucket would make the caller wait too long."""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> bool:
+        if self.delay():
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds: float):
+        """Empty the bucket so it only refills after ``seconds``."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+def parse_rate(spec: str) -> tuple:
+    """Turn ``"<requests>/<seconds>"`` into ``(rate per second, burst)``."""
+    requests, seconds = spec.split("/")
+    return float(requests) / float(seconds), float(requests)
+
+
+class RateLimiter:
+    """Token buckets keyed by ``(scope, key)``.
+
+    ``limits`` maps a scope ("user", "guild", "delete", "upstream") or an exact
+    ``"upstream:<host>"`` key to a rate spec. Keys without a limit are never
+    throttled. Buckets are kept in LRU order and capped at ``max_buckets``.
+    """
+
+    def __init__(self, limits: dict, max_buckets: int = 50000):
+        self.limits = {name: parse_rate(spec) for name, spec in limits.items()}
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict = OrderedDict()
+        self.stats = {"allowed": 0, "limited": 0, "waited": 0, "retry_after": 0}
+
+    def _bucket(self, scope: str, key: str) -> Optional[TokenBucket]:
+        limit = self.limits.get(f"{scope}:{key}") or self.limits.get(scope)
+        if limit is None:
+            return None
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            bucket = self._buckets[(scope, key)] = TokenBucket(*limit)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((scope, key))
+        return bucket
+
+    def allow(self, scope: str, key: str) -> bool:
+        """Take a token if one is available right now."""
+        bucket = self._bucket(scope, key)
+        if bucket is None or bucket.take():
+            self.stats["allowed"] += 1
+            return True
+        self.stats["limited"] += 1
+        return False
+
+    async def acquire(self, scope: str, key: str, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        """Wait for a token, raising ``RateLimited`` if it's over ``max_wait`` away."""
+        bucket = self._bucket(scope, key)
+        if bucket is None:
+            return
+        while not bucket.take():
+            delay = bucket.delay()
+            if delay > max_wait:
+                self.stats["limited"] += 1
+                raise RateLimited(f"{key} is rate limited for {delay:.0f}s")
+            self.stats["waited"] += 1
+            await asyncio.sleep(delay)
+        self.stats["allowed"] += 1
+
+    def delay(self, scope: str, key: str) -> float:
+        """Seconds until ``key`` has a token, without taking it."""
+        bucket = self._bucket(scope, key)
+        return bucket.delay() if bucket is not None else 0.0
+
+    def retry_after(self, scope: str, key: str, header: Optional[str]):
+        """Apply an upstream ``Retry-After`` header (seconds) to the bucket."""
+        bucket = self._bucket(scope, key)
+        try:
+            seconds = float(header)
+        except (TypeError, ValueError):
+            seconds = 60.0
+        if bucket is not None:
+            bucket.pause(seconds)
+            self.stats["retry_after"] += 1
+
+
+rate_limiter = RateLimiter(
     {
-        "type": "function",
-        "function": {
-            "name": "whats_new",
-            "description": "Show recent bot updates.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
+        "user": RATE_LIMIT_USER,
+        "guild": RATE_LIMIT_GUILD,
+        "delete": RATE_LIMIT_DELETE,
+        **{f"upstream:{host}": spec for host, spec in UPSTREAM_RATE_LIMITS.items()},
+    }
+)
+
+GROQ_HOST = "api.groq.com"
+# Caps in-flight model calls so a burst of mentions can't open unbounded sockets.
+completion_slots = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+
+_groq_client = None
+
+
+def get_groq_client():
+    """The shared ``AsyncGroq`` client, created on first use; None without a key."""
+    global _groq_client
+    if _groq_client is None and GROQ_API_KEY:
+        # groq (and pydantic under it) is the slowest import; defer it.
+        from groq import AsyncGroq
+
+        _groq_client = AsyncGroq(
+            api_key=GROQ_API_KEY, timeout=GROQ_TIMEOUT, max_retries=1
+        )
+    return _groq_client
+
+
+async def close_groq_client():
+    global _groq_client
+    if _groq_client is not None:
+        await _groq_client.close()
+        _groq_client = None
+
+
+async def create_completion(started: Optional[asyncio.Event] = None, **kwargs):
+    """Run one chat completion without blocking the event loop.
+
+    The call is bounded by ``completion_slots`` and cancelled after
+    ``GROQ_TIMEOUT`` seconds; cancelling the calling task aborts the request.
+    Only the upstream call is timed for the model router, and ``started``
+    is set when it begins, after the local rate-limit and slot waits.
+    """
+    await rate_limiter.acquire("upstream", GROQ_HOST)
+    async with completion_slots, model_router.measure(kwargs["model"]):
+        if started is not None:
+            started.set()
+        try:
+            return await asyncio.wait_for(
+                get_groq_client().chat.completions.create(**kwargs),
+                timeout=GROQ_TIMEOUT,
+            )
+        except Exception as e:
+            # groq.RateLimitError, matched by status to keep groq lazily imported.
+            if getattr(e, "status_code", None) == 429:
+                rate_limiter.retry_after(
+                    "upstream", GROQ_HOST, e.response.headers.get("retry-after")
+                )
+            raise
+
+
+class ModelHealth:
+    """Rolling latency/error window and circuit state for one model."""
+
+    def __init__(self, window: int = 50):
+        self.samples: deque = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    @property
+    def p95(self) -> float:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+class ModelRouter:
+    """Orders ``models`` by health and runs completions against them.
+
+    A model whose calls fail ``failure_threshold`` times in a row is skipped
+    (circuit open) for ``open_seconds``; after that a single request probes
+    it (half-open) and either closes the circuit or re-opens it. With
+    ``slow_p95`` set, a model whose p95 latency is over it is tried after
+    the healthy ones. With ``hedge_after`` set, ``complete`` also fires the
+    next model if the first hasn't answered in time and takes whichever
+    answers first. ``decisions`` counts what the router did.
+    """
+
+    def __init__(
+        self,
+        models: list,
+        failure_threshold: int = 3,
+        open_seconds: float = 30,
+        slow_p95: float = 0,
+        hedge_after: float = 0,
+    ):
+        self.models = models
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_p95 = slow_p95
+        self.hedge_after = hedge_after
+        self.health = {model: ModelHealth() for model in models}
+        self.decisions = {
+            "primary": 0,
+            "fallback": 0,
+            "skipped_open": 0,
+            "half_open_probe": 0,
+            "demoted_slow": 0,
+            "all_open": 0,
+            "hedged": 0,
+            "hedge_won": 0,
+        }
+
+    def plan(self) -> list:
+        """Models to try for one request, best first."""
+        now = time.monotonic()
+        healthy, slow = [], []
+        for model in self.models:
+            health = self.health[model]
+            if health.state != "closed":
+                # Open, or half-open with a probe still out: wait it out. A
+                # probe that never got used is retried after the same delay.
+                if now - health.opened_at < self.open_seconds:
+                    self.decisions["skipped_open"] += 1
+                    continue
+                health.state = "half_open"
+                health.opened_at = now
+                self.decisions["half_open_probe"] += 1
+            if self.slow_p95 and health.p95 > self.slow_p95:
+                slow.append(model)
+            else:
+                healthy.append(model)
+        if slow and healthy:
+            self.decisions["demoted_slow"] += 1
+        plan = healthy + slow
+        if not plan:
+            self.decisions["all_open"] += 1
+            return list(self.models)
+        return plan
+
+    def record(self, model: str, latency: float, ok: bool):
+        health = self.health[model]
+        health.samples.append((latency, ok))
+        if ok:
+            health.consecutive_failures = 0
+            health.state = "closed"
+            return
+        health.consecutive_failures += 1
+        if (
+            health.state == "half_open"
+            or health.consecutive_failures >= self.failure_threshold
+        ):
+            if health.state != "open":
+                log_event(logging.WARNING, "model_circuit_opened", model=model)
+            health.state = "open"
+            health.opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def measure(self, model: str):
+        """Record the latency and outcome of the block for ``model``."""
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            latency = time.monotonic() - start
+            self.record(model, latency, False)
+            completion_seconds.observe(latency, model=model, outcome="error")
+            raise
+        latency = time.monotonic() - start
+        self.record(model, latency, True)
+        completion_seconds.observe(latency, model=model, outcome="ok")
+
+    async def complete(self, model: str, hedge_model: Optional[str], **request):
+        """Run a completion on ``model``, hedging onto ``hedge_model`` if slow.
+
+        The hedge delay counts from when the upstream call starts, not from
+        local queueing. Returns ``(response, model_that_answered)``.
+        """
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(
+            create_completion(model=model, started=started, **request)
+        )
+        if not (self.hedge_after and hedge_model):
+            return await primary, model
+
+        owners = {primary: model}
+        waiter = asyncio.ensure_future(started.wait())
+        pending = {primary, waiter}
+        error = None
+        try:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            pending.discard(waiter)
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=self.hedge_after)
+            if primary.done():
+                return primary.result(), model
+
+            self.decisions["hedged"] += 1
+            hedge = asyncio.ensure_future(
+                create_completion(model=hedge_model, **request)
+            )
+            owners[hedge] = hedge_model
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.decisions["hedge_won"] += 1
+                        return task.result(), owners[task]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+model_router = ModelRouter(
+    MODELS,
+    failure_threshold=MODEL_FAILURE_THRESHOLD,
+    open_seconds=MODEL_OPEN_SECONDS,
+    slow_p95=MODEL_SLOW_P95,
+    hedge_after=MODEL_HEDGE_AFTER,
+)
+
+
+async def stream_completion(reply, **kwargs):
+    """Stream one chat completion into ``reply`` as the text arrives.
+
+    Returns ``(assistant_message, payload)``: an object shaped like the
+    non-streaming ``message`` (``content``, ``tool_calls``) and the dict to
+    send back to the model on the next round.
+    """
+
+    async def consume():
+        stream = await get_groq_client().chat.completions.create(
+            stream=True, **kwargs
+        )
+        content = []
+        tool_calls = {}
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                reply.feed(delta.content)
+            for part in delta.tool_calls or []:
+                call = tool_calls.setdefault(
+                    part.index, {"id": None, "name": "", "arguments": ""}
+                )
+                call["id"] = part.id or call["id"]
+                if part.function:
+                    call["name"] += part.function.name or ""
+                    call["arguments"] += part.function.arguments or ""
+        return "".join(content), [tool_calls[i] for i in sorted(tool_calls)]
+
+    await rate_limiter.acquire("upstream", GROQ_HOST)
+    async with completion_slots, model_router.measure(kwargs["model"]):
+        try:
+            text, calls = await asyncio.wait_for(consume(), timeout=GROQ_TIMEOUT)
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                rate_limiter.retry_after(
+                    "upstream", GROQ_HOST, e.response.headers.get("retry-after")
+                )
+            raise
+
+    payload = {"role": "assistant", "content": text}
+    if calls:
+        payload["tool_calls"] = [
+            {
+                "id": call["id"],
+                "type": "function",
+                "function": {"name": call["name"], "arguments": call["arguments"]},
+            }
+            for call in calls
+        ]
+    message = SimpleNamespace(
+        content=text or None,
+        tool_calls=[
+            SimpleNamespace(
+                id=call["id"],
+                function=SimpleNamespace(
+                    name=call["name"], arguments=call["arguments"] or "{}"
+                ),
+            )
+            for call in calls
+        ]
+        or None,
+    )
+    return message, payload
+
+
+class HttpClient:
+    """Long-lived aiohttp session shared by every tool.
+
+    The session is created lazily inside the running loop and keeps a pooled,
+    keep-alive connector with DNS caching. ``stats`` counts pool reuse versus
+    new connections so handshake overhead is visible.
+    """
+
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+        dns_ttl: int = HTTP_DNS_TTL,
+        keepalive: float = HTTP_KEEPALIVE,
+        timeout: float = HTTP_TIMEOUT,
+        upstream_override: str = HTTP_UPSTREAM_OVERRIDE,
+    ):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._dns_ttl = dns_ttl
+        self._keepalive = keepalive
+        self._timeout = timeout
+        self._upstream_override = upstream_override
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.stats = {
+            "requests": 0,
+            "pool_hits": 0,
+            "handshakes": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _count(self, key):
+        async def handler(session, trace_ctx, params):
+            self.stats[key] += 1
+
+        return handler
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_reuseconn.append(self._count("pool_hits"))
+        trace.on_connection_create_end.append(self._count("handshakes"))
+        trace.on_dns_cache_hit.append(self._count("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(self._count("dns_cache_misses"))
+        return trace
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self._dns_ttl,
+                keepalive_timeout=self._keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        parts = urlsplit(url)
+        host = parts.hostname
+        await rate_limiter.acquire("upstream", host)
+        self.stats["requests"] += 1
+        if self._upstream_override:
+            url = f"{self._upstream_override}/{parts.netloc}{parts.path}"
+            if parts.query:
+                url += f"?{parts.query}"
+        async with self.session.request(method, url, **kwargs) as response:
+            http_responses.inc(host=host, status=response.status)
+            if response.status == 429:
+                rate_limiter.retry_after(
+                    "upstream", host, response.headers.get("Retry-After")
+                )
+            yield response
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+http_client = HttpClient()
+
+
+class UpstreamError(Exception):
+    """Non-success HTTP status from an upstream API."""
+
+    def __init__(self, status: int):
+        super().__init__(f"upstream returned status {status}")
+        self.status = status
+
+
+class TTLCache:
+    """Async LRU cache with per-entry expiry and single-flight fetches.
+
+    Concurrent misses for the same key share one ``fetch`` call. A fetch
+    result of ``None`` or an exception is returned to the callers but never
+    stored.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get_or_fetch(self, key, fetch, ttl: Optional[float] = None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(
+                lambda done: self._store(key, done, self.ttl if ttl is None else ttl)
+            )
+        else:
+            self.stats["coalesced"] += 1
+        # Shielded so one caller being cancelled doesn't cancel the shared fetch.
+        return await asyncio.shield(task)
+
+    def _store(self, key, task, ttl: float):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if value is None:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+weather_cache = TTLCache(ttl=WEATHER_TTL)
+crypto_cache = TTLCache(ttl=CRYPTO_TTL)
+wolfram_cache = TTLCache(ttl=WOLFRAM_TTL)
+response_caches = {
+    "weather": weather_cache,
+    "crypto": crypto_cache,
+    "calculate": wolfram_cache,
+}
+
+# Pure arithmetic or symbolic-math requests; their answers never change, so
+# they are cached far longer than factual or unit/currency lookups.
+_DETERMINISTIC_QUERY = re.compile(
+    r"^\s*(?:[\d\s+\-*/^%().,=<>!xπ]+"
+    r"|(?:solve|integrate|differentiate|derivative of|simplify|factor|expand"
+    r"|limit|sqrt|factorial)\b.*)$",
+    re.IGNORECASE,
+)
+
+
+def is_deterministic_query(query: str) -> bool:
+    return bool(_DETERMINISTIC_QUERY.match(query))
+
+
+def normalize_prompt(text: str) -> str:
+    text = re.sub(r"['’]", "", text.lower())
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+# Prompts that lean on the conversation so far, or on who is asking: pronouns
+# and references back ("what about it", "and in Paris?", "like you said").
+_CONTEXTUAL_PROMPT = re.compile(
+    r"^\s*(?:and|but|or|so|also|then|what about|how about)\b"
+    r"|\b(?:it|its|that|this|these|those|they|them|their|he|him|his|she|her"
+    r"|i|me|my|mine|we|us|our|again|instead|else|another|same|above|previous"
+    r"|earlier|before|last|you said|you (?:just )?(?:told|mentioned|meant))\b",
+    re.IGNORECASE,
+)
+
+
+def is_context_free(prompt: str) -> bool:
+    """Whether ``prompt`` reads the same without the conversation before it."""
+    return not _CONTEXTUAL_PROMPT.search(prompt)
+
+
+def anchor_tokens(text: str) -> frozenset:
+    """Words a near-match must share: numbers ("16th") and short words ("km")."""
+    return frozenset(
+        word for word in text.split() if len(word) <= 3 or re.search(r"\d", word)
+    )
+
+
+def trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class ChatResponseCache:
+    """TTL/LRU cache of chat answers keyed by normalized prompt.
+
+    A lookup tries the exact normalized prompt first. Failing that, and with
+    ``threshold`` below 1, it returns the answer of the cached prompt with
+    the highest character-trigram Jaccard similarity at or above
+    ``threshold``, found through an inverted trigram index. A near-match
+    must have the same ``anchor_tokens``, so "16th president" never gets
+    the "26th president" answer.
+    """
+
+    def __init__(self, ttl: float, maxsize: int, threshold: float):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._entries: OrderedDict = OrderedDict()
+        self._index: dict = {}
+        self.stats = {
+            "hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "stored": 0,
+            "uncacheable": 0,
+            "contextual": 0,
+            "evictions": 0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, prompt: str) -> Optional[str]:
+        key = normalize_prompt(prompt)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[2]
+            self._remove(key)
+        if self.threshold < 1:
+            grams = trigrams(key)
+            shared: dict = {}
+            for gram in grams:
+                for other in self._index.get(gram, ()):
+                    shared[other] = shared.get(other, 0) + 1
+            anchors = anchor_tokens(key)
+            best, best_score = None, self.threshold
+            for other, count in shared.items():
+                score = count / (len(grams) + len(self._entries[other][1]) - count)
+                if (
+                    score >= best_score
+                    and self._entries[other][0] > now
+                    and anchor_tokens(other) == anchors
+                ):
+                    best, best_score = other, score
+            if best is not None:
+                self._entries.move_to_end(best)
+                self.stats["similar_hits"] += 1
+                return self._entries[best][2]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, prompt: str, response: str):
+        key = normalize_prompt(prompt)
+        if key in self._entries:
+            self._remove(key)
+        grams = trigrams(key)
+        self._entries[key] = (time.monotonic() + self.ttl, grams, response)
+        for gram in grams:
+            self._index.setdefault(gram, set()).add(key)
+        self.stats["stored"] += 1
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        _, grams, _ = self._entries.pop(key)
+        for gram in grams:
+            keys = self._index[gram]
+            keys.discard(key)
+            if not keys:
+                del self._index[gram]
+
+    def clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+
+chat_cache = (
+    ChatResponseCache(CHAT_CACHE_TTL, CHAT_CACHE_SIZE, CHAT_CACHE_SIMILARITY)
+    if CHAT_CACHE
+    else None
+)
+
+
+class SchedulerFull(Exception):
+    """Raised when a guild already has too many chat requests waiting."""
+
+
+class ChatScheduler:
+    """Admission control and fair ordering for chat requests.
+
+    Requests for one context key run one at a time so their history updates
+    can't interleave. At most ``max_active`` requests run overall and
+    ``per_guild`` per guild; the rest wait in per-guild queues that are
+    served round-robin, so one busy guild can't starve the others. A guild
+    with ``max_queue`` requests already waiting gets ``SchedulerFull``.
+    """
+
+    def __init__(self, max_active: int, per_guild: int, max_queue: int):
+        self.max_active = max_active
+        self.per_guild = per_guild
+        self.max_queue = max_queue
+        self._queues: OrderedDict = OrderedDict()
+        self._active: dict = {}
+        self._active_total = 0
+        self._waiting: dict = {}
+        self._context_locks: dict = {}
+        self.wait_times: deque = deque(maxlen=500)
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0}
+
+    @property
+    def depth(self) -> int:
+        return sum(self._waiting.values())
+
+    @property
+    def active(self) -> int:
+        return self._active_total
+
+    def wait_p95(self) -> float:
+        waits = sorted(self.wait_times)
+        return waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+
+    @asynccontextmanager
+    async def slot(self, guild_key: str, context_key: str):
+        if self._waiting.get(guild_key, 0) >= self.max_queue:
+            self.stats["shed"] += 1
+            raise SchedulerFull(guild_key)
+        self._waiting[guild_key] = self._waiting.get(guild_key, 0) + 1
+        enqueued_at = time.monotonic()
+        lock, users = self._context_locks.get(context_key, (asyncio.Lock(), 0))
+        self._context_locks[context_key] = (lock, users + 1)
+        waiting = True
+        try:
+            async with lock:
+                await self._admit(guild_key)
+                self._stop_waiting(guild_key)
+                waiting = False
+                self.wait_times.append(time.monotonic() - enqueued_at)
+                try:
+                    yield
+                finally:
+                    self._release(guild_key)
+        finally:
+            if waiting:
+                self._stop_waiting(guild_key)
+            lock, users = self._context_locks[context_key]
+            if users == 1:
+                del self._context_locks[context_key]
+            else:
+                self._context_locks[context_key] = (lock, users - 1)
+
+    def _stop_waiting(self, guild_key: str):
+        self._waiting[guild_key] -= 1
+        if not self._waiting[guild_key]:
+            del self._waiting[guild_key]
+
+    def _has_room(self, guild_key: str) -> bool:
+        return (
+            self._active_total < self.max_active
+            and self._active.get(guild_key, 0) < self.per_guild
+        )
+
+    def _start(self, guild_key: str):
+        self._active[guild_key] = self._active.get(guild_key, 0) + 1
+        self._active_total += 1
+        self.stats["admitted"] += 1
+
+    async def _admit(self, guild_key: str):
+        if guild_key not in self._queues and self._has_room(guild_key):
+            self._start(guild_key)
+            return
+        self.stats["queued"] += 1
+        turn = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(guild_key, deque()).append(turn)
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # The slot was granted just as we were cancelled; hand it on.
+                self._release(guild_key)
+            else:
+                self._queues[guild_key].remove(turn)
+                if not self._queues[guild_key]:
+                    del self._queues[guild_key]
+            raise
+
+    def _release(self, guild_key: str):
+        self._active[guild_key] -= 1
+        if not self._active[guild_key]:
+            del self._active[guild_key]
+        self._active_total -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to queued guilds in round-robin order."""
+        granted = True
+        while granted and self._active_total < self.max_active:
+            granted = False
+            for guild_key in list(self._queues):
+                if not self._has_room(guild_key):
+                    continue
+                queue = self._queues.pop(guild_key)
+                self._start(guild_key)
+                queue.popleft().set_result(None)
+                if queue:
+                    # Re-inserting moves the guild to the back of the rotation.
+                    self._queues[guild_key] = queue
+                granted = True
+                break
+
+
+chat_scheduler = ChatScheduler(
+    max_active=CHAT_MAX_CONCURRENCY,
+    per_guild=CHAT_MAX_PER_GUILD,
+    max_queue=CHAT_MAX_QUEUE_PER_GUILD,
+)
+
+metrics.collected(
+    "localbot_conversations",
+    "Conversation contexts held in memory, by shard.",
+    lambda: {
+        shard: len(store) for shard, store in conversation_memory.partitions.items()
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "gt",
-            "description": "Share a picture of GT.",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False,
-            },
-            "strict": True,
+    label="shard",
+)
+metrics.collected(
+    "localbot_conversation_evictions_total",
+    "Conversation contexts dropped from memory, by reason.",
+    lambda: conversation_memory.stats,
+    type="counter",
+    label="reason",
+)
+metrics.collected(
+    "localbot_cache_entries",
+    "Entries in each tool response cache.",
+    lambda: {name: len(cache) for name, cache in response_caches.items()},
+    label="cache",
+)
+for _event in ("hits", "misses", "coalesced", "evictions"):
+    metrics.collected(
+        f"localbot_cache_{_event}_total",
+        f"Tool response cache {_event}.",
+        lambda event=_event: {
+            name: cache.stats[event] for name, cache in response_caches.items()
         },
+        type="counter",
+        label="cache",
+    )
+metrics.collected(
+    "localbot_http_pool_events_total",
+    "Shared HTTP session connection events.",
+    lambda: http_client.stats,
+    type="counter",
+    label="event",
+)
+metrics.collected(
+    "localbot_model_routing_total",
+    "Model router decisions.",
+    lambda: model_router.decisions,
+    type="counter",
+    label="decision",
+)
+metrics.collected(
+    "localbot_model_circuit_open",
+    "Processes in which a model's circuit is not closed.",
+    lambda: {
+        model: int(health.state != "closed")
+        for model, health in model_router.health.items()
     },
-]
-
-groq_client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+    label="model",
+)
+metrics.collected(
+    "localbot_chat_queue_depth", "Chat requests waiting.", lambda: chat_scheduler.depth
+)
+metrics.collected(
+    "localbot_chat_active", "Chat requests running.", lambda: chat_scheduler.active
+)
+metrics.collected(
+    "localbot_chat_wait_p95_seconds",
+    "p95 time chat requests waited for a slot.",
+    chat_scheduler.wait_p95,
+)
+metrics.collected(
+    "localbot_chat_admission_total",
+    "Chat scheduler admissions, queued requests and shed requests.",
+    lambda: chat_scheduler.stats,
+    type="counter",
+    label="event",
+)
+metrics.collected(
+    "localbot_rate_limit_total",
+    "Rate limiter decisions.",
+    lambda: rate_limiter.stats,
+    type="counter",
+    label="event",
+)
+metrics.collected(
+    "localbot_chat_cache_entries",
+    "Chat answers held in the response cache.",
+    lambda: len(chat_cache) if chat_cache else 0,
+)
+metrics.collected(
+    "localbot_chat_cache_total",
+    "Chat response cache lookups and stores.",
+    lambda: chat_cache.stats if chat_cache is not None else {},
+    type="counter",
+    label="event",
+)
+
+
+def context_key_for(server_id: Optional[str], channel_id: str, user_id: str) -> str:
+    return server_id if server_id else f"DM-{channel_id}-{user_id}"
 
 
 async def send_response(ctx, message):
+    start = time.monotonic()
     if hasattr(ctx, "respond"):
         await ctx.respond(message)
     else:
         await ctx.reply(message)
+    discord_send_seconds.observe(time.monotonic() - start, kind="response")
     return message
 
 
+async def send_embeds(ctx, image_urls):
+    """Send one image embed per URL, all in a single message."""
+    embeds = [discord.Embed().set_image(url=url) for url in image_urls]
+    start = time.monotonic()
+    try:
+        if hasattr(ctx, "respond"):
+            await ctx.followup.send(embeds=embeds)
+        else:
+            await ctx.send(embeds=embeds)
+    except discord.HTTPException as e:
+        log_event(logging.WARNING, "embeds_failed", error=str(e))
+    discord_send_seconds.observe(time.monotonic() - start, kind="embeds")
+
+
+# One pass over the LLM API text: section headers ("Result:" on its own line
+# after a blank line) and "image: <url>" lines, in document order.
+_WOLFRAM_LINE = re.compile(
+    r"^[ \t]*image:[ \t]*(?P<image>https://\S+)|^(?P<title>\S[^\n]*?):[ \t]*$",
+    re.IGNORECASE,
+)
+
+
+@dataclass(slots=True, frozen=True)
+class WolframResult:
+    text: str
+    sections: tuple = ()  # (title, body) pairs; "" titles the preamble
+    images: tuple = ()
+
+    @property
+    def summary(self) -> str:
+        """The sections without their image lines, which ``images`` holds."""
+        if not self.sections:
+            return self.text
+        return "\n\n".join(
+            f"{title}:\n{body}".strip() if title else body
+            for title, body in self.sections
+        )
+
+
+def parse_wolfram(text: str) -> WolframResult:
+    """Split an LLM API answer into its sections and image URLs.
+
+    A heading is a line ending in a colon at the start of the text, after a
+    blank line or right after an image line.
+    """
+    sections = []
+    images = []
+    title, body = "", []
+    heading = True
+    for line in text.splitlines():
+        match = _WOLFRAM_LINE.match(line)
+        if match and match["image"]:
+            if match["image"] not in images:
+                images.append(match["image"])
+            heading = True
+            continue
+        if match and heading:
+            if title or "".join(body).strip():
+                sections.append((title, "\n".join(body).strip()))
+            title, body = match["title"], []
+        else:
+            body.append(line)
+        heading = not line.strip()
+    if title or "".join(body).strip():
+        sections.append((title, "\n".join(body).strip()))
+    return WolframResult(text, tuple(sections), tuple(images))
+
+
+async def fetch_wolfram(query: str):
+    """Fetch and parse the LLM API answer as ``(status, WolframResult)``.
+
+    Only 200 and 501 (not understood, with suggestions) are returned; the
+    cache stores the parsed result, so a repeat query skips the parse.
+    """
+    base_url = "https://www.wolframalpha.com/api/v1/llm-api"
+    params = {"input": query, "appid": WOLF, "maxchars": 2000}
+    async with http_client.get(base_url, params=params) as response:
+        if response.status not in (200, 501):
+            raise UpstreamError(response.status)
+        return response.status, parse_wolfram(await response.text())
+
+
+@tool(
+    "calculate",
+    "Perform mathematical calculations or factual queries using Wolfram Alpha.",
+    {"query": ToolParam(str, "The math query or factual question.")},
+    rate_bucket="www.wolframalpha.com",
+    keywords=(
+        r"\b(?:calc\w*|math\w*|solve|integra\w*|derivative|differentiate|equation"
+        r"|convert\w*|conversion|how (?:much|many|far|long|tall|big|old|fast)"
+        r"|population|distance|capital of|define|definition|formula|percent\w*"
+        r"|sqrt|square root|factorial|(?:who|when|where) (?:is|was|were|did)"
+        r"|what(?:'s| is) (?:the )?\d|in (?:usd|eur|km|miles|kg|lbs?|celsius|fahrenheit))\b"
+        r"|\d\s*(?:[-+*/^%×÷x]|plus|minus|times|divided by)\s*\d"
+    ),
+)
 async def calculate(ctx, query, from_tool_call=False):
     """Calculate using Wolfram Alpha LLM API."""
     try:
-        base_url = "https://www.wolframalpha.com/api/v1/llm-api"
-        params = {"input": query, "appid": WOLF, "maxchars": 2000}
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(base_url, params=params) as response:
-                if response.status == 200:
-                    result = await response.text()
-
-                    # Extract image URLs from the result
-                    image_urls = []
-                    lines = result.split("\n")
-                    for line in lines:
-                        if (
-                            line.strip().startswith("image: https://")
-                            or line.strip().startswith("Image:")
-                            and "https://" in line
-                        ):
-                            # Extract URL from the line
-                            url_start = line.find("https://")
-                            if url_start != -1:
-                                url_end = line.find(" ", url_start)
-                                if url_end == -1:
-                                    url_end = len(line)
-                                image_url = line[url_start:url_end].strip()
-                                if (
-                                    image_url.endswith(".png")
-                                    or image_url.endswith(".jpg")
-                                    or image_url.endswith(".jpeg")
-                                ):
-                                    image_urls.append(image_url)
-
-                    if not from_tool_call:
-                        await send_response(ctx, result)
-                        # Send images if found
-                        if image_urls:
-                            for img_url in image_urls[:3]:  # Limit to 3 images max
-                                try:
-                                    embed = discord.Embed()
-                                    embed.set_image(url=img_url)
-                                    if hasattr(ctx, "respond"):
-                                        await ctx.followup.send(embed=embed)
-                                    else:
-                                        await ctx.send(embed=embed)
-                                except Exception as e:
-                                    pass
-
-                    # Include image URLs in the return for tool calls
-                    if image_urls:
-                        result += f"\n\nImages available: {', '.join(image_urls[:3])}"
-
-                    return result
-                elif response.status == 501:
-                    error_msg = await response.text()
-                    if not from_tool_call:
-                        await send_response(ctx, f"Could not interpret query: {query}")
-                    return (
-                        f"Could not interpret query: {query}. Suggestions: {error_msg}"
-                    )
-                elif response.status == 403:
-                    error_msg = "Invalid or missing Wolfram Alpha API key"
-                    if not from_tool_call:
-                        await send_response(ctx, error_msg)
-                    return error_msg
-                else:
-                    error_msg = f"Wolfram Alpha API error (status {response.status})"
-                    if not from_tool_call:
-                        await send_response(ctx, error_msg)
-                    return error_msg
+        ttl = WOLFRAM_MATH_TTL if is_deterministic_query(query) else WOLFRAM_TTL
+        status, result = await wolfram_cache.get_or_fetch(
+            " ".join(query.split()), lambda: fetch_wolfram(query), ttl=ttl
+        )
+
+        if status == 200:
+            images = result.images[:3]  # Limit to 3 images max
+            if not from_tool_call:
+                await send_response(ctx, result.summary)
+                if images:
+                    await send_embeds(ctx, images)
+
+            # Include image URLs in the return for tool calls
+            if images:
+                return f"{result.summary}\n\nImages available: {', '.join(images)}"
+            return result.summary
+        else:
+            if not from_tool_call:
+                await send_response(ctx, f"Could not interpret query: {query}")
+            return f"Could not interpret query: {query}. Suggestions: {result.text}"
 
+    except UpstreamError as e:
+        if e.status == 403:
+            error_msg = "Invalid or missing Wolfram Alpha API key"
+        else:
+            error_msg = f"Wolfram Alpha API error (status {e.status})"
+        if not from_tool_call:
+            await send_response(ctx, error_msg)
+        return error_msg
     except Exception as e:
         error_msg = f"Error calculating: {str(e)}"
         if not from_tool_call:
@@ -442,6 +2277,21 @@ async def calculate(ctx, query, from_tool_call=False):
         return error_msg
 
 
+def select_tools(prompt: str, memory) -> list:
+    """Tool schemas to send with ``prompt``; all of them unless TOOL_SELECTION=keyword.
+
+    The previous user message is scanned too, so follow-ups such as "and in
+    Paris?" keep the tools of the turn they follow.
+    """
+    if TOOL_SELECTION != "keyword":
+        return TOOLS
+    previous = next(
+        (m.content for m in reversed(memory.chat_memory.messages) if m.type == "human"),
+        "",
+    )
+    return tool_registry.select(prompt, previous)
+
+
 async def generate_chat_completion(
     ctx: commands.Context,
     server_id: Optional[str],
@@ -449,66 +2299,104 @@ async def generate_chat_completion(
     user_id: str,
     prompt: str,
     is_tool_followup: bool = False,
+    reply: Optional["StreamingReply"] = None,
 ) -> Optional[str]:
-    """Generate a chat completion response using Groq with native tool calling."""
-    try:
-        global conversation_memory
-        context_key = server_id if server_id else f"DM-{channel_id}-{user_id}"
+    """Generate a chat completion response using Groq with native tool calling.
 
-        if context_key not in conversation_memory:
-            conversation_memory[context_key] = ConversationBufferWindowMemory(
-                return_messages=True
-            )
-
-        memory = conversation_memory[context_key]
+    With ``reply`` set, output is streamed into it as it is generated.
+    """
+    try:
+        context_key = context_key_for(server_id, channel_id, user_id)
+        memory = await conversation_memory.acquire(context_key)
 
-        if not groq_client:
+        if not GROQ_API_KEY:
             await send_response(
                 ctx,
                 "Groq client is not configured. Please check your GROQ_API_KEY.",
             )
             return None
 
-        # Build consistent messages format for Groq
-        messages = [{"role": "system", "content": system_prompt}]
-        chat_history = memory.chat_memory.messages
-        for msg in chat_history:
-            if hasattr(msg, "content"):
-                role = "user" if msg.type == "human" else "assistant"
-                messages.append({"role": role, "content": msg.content})
-
-        # Add the current prompt
-        messages.append({"role": "user", "content": prompt})
-
-        models_to_try = ["openai/gpt-oss-120b", "openai/gpt-oss-20b"]
+        # A prompt that doesn't refer back to the conversation is looked up
+        # whatever the history, but only answers generated without any
+        # history (which could have leaked into them) are stored.
+        # The speaker prefix ("name: ") is left out of the cache key.
+        speaker, _, question = prompt.partition(": ")
+        if not question:
+            speaker, question = "", prompt
+        cacheable = chat_cache is not None and is_context_free(question)
+        fresh_context = (
+            not memory.chat_memory.messages and not memory.chat_memory.summary
+        )
+        if chat_cache is not None and not cacheable:
+            chat_cache.stats["contextual"] += 1
+        if cacheable:
+            response_text = chat_cache.get(question)
+            if response_text is not None:
+                memory.chat_memory.add_user_message(prompt)
+                memory.chat_memory.add_ai_message(response_text)
+                return response_text
+
+        # Memory keeps the serialized history; only the new prompt is added.
+        messages = memory.chat_memory.prompt + [{"role": "user", "content": prompt}]
+        base_length = len(messages)
+        tools = select_tools(question, memory)
+        # Swapped in the per-request copy only; memory keeps SYSTEM_MESSAGE.
+        messages[0] = SYSTEM_MESSAGES[(SYSTEM_PROMPT_VARIANT, bool(tools))]
+
+        models_to_try = model_router.plan()
         response_text = None
         last_error = None
 
-        for model_name in models_to_try:
+        for attempt, model_name in enumerate(models_to_try):
+            model_router.decisions["primary" if attempt == 0 else "fallback"] += 1
+            # Hedging needs a second model and isn't used while streaming.
+            hedge_model = (
+                models_to_try[attempt + 1]
+                if attempt + 1 < len(models_to_try) and reply is None
+                else None
+            )
             try:
-                # Local copy of messages for the loop
-                curr_messages = list(messages)
+                # Drop the previous model's tool turns instead of copying.
+                del messages[base_length:]
+                if reply is not None:
+                    reply.reset()
+                tools_used = set()
+                curr_messages = messages
                 tool_use_depth = 0
                 max_depth = 5
 
                 while tool_use_depth < max_depth:
-                    response = groq_client.chat.completions.create(
+                    request = dict(
                         messages=curr_messages,
-                        model=model_name,
-                        tools=TOOLS,
                         max_completion_tokens=1024,
                         temperature=0.7,
                     )
-
-                    assistant_message = response.choices[0].message
-                    curr_messages.append(assistant_message)
+                    if tools:
+                        request["tools"] = tools
+                    if reply is not None:
+                        assistant_message, payload = await stream_completion(
+                            reply, model=model_name, **request
+                        )
+                        curr_messages.append(payload)
+                    else:
+                        # A hedge win pins the rest of the tool loop to that model.
+                        response, model_name = await model_router.complete(
+                            model_name, hedge_model, **request
+                        )
+                        assistant_message = response.choices[0].message
+                        curr_messages.append(assistant_message)
 
                     if assistant_message.tool_calls:
                         tool_use_depth += 1
-                        for tool_call in assistant_message.tool_calls:
-                            result = await handle_tool_call(
-                                ctx, tool_call, send_directly=True
-                            )
+                        tools_used.update(
+                            call.function.name for call in assistant_message.tool_calls
+                        )
+                        results = await run_tool_calls(
+                            ctx, assistant_message.tool_calls
+                        )
+                        for tool_call, result in zip(
+                            assistant_message.tool_calls, results
+                        ):
                             curr_messages.append(
                                 {
                                     "role": "tool",
@@ -519,94 +2407,463 @@ async def generate_chat_completion(
                         continue  # Call model again with tool results
                     else:
                         response_text = assistant_message.content
+                        tool_use_depth_rounds.observe(tool_use_depth)
                         break
 
                 if response_text:
                     break
+            except RateLimited:
+                # A local throttle is not a model fault; falling back would
+                # only spend another upstream token.
+                raise
             except Exception as e:
-                print(f"Error with model {model_name}: {e}")
+                log_event(
+                    logging.WARNING, "model_error", model=model_name, error=str(e)
+                )
                 last_error = e
                 continue
 
         if not response_text:
             raise last_error or Exception("Failed to get response from Groq models")
 
+        if cacheable:
+            # Answers that drew on history, used live or side-effecting tools,
+            # or address the speaker by name are not reusable.
+            if fresh_context and tool_registry.all_cacheable(tools_used) and (
+                not speaker or speaker.lower() not in response_text.lower()
+            ):
+                chat_cache.put(question, response_text)
+            else:
+                chat_cache.stats["uncacheable"] += 1
+
         memory.chat_memory.add_user_message(prompt)
         memory.chat_memory.add_ai_message(response_text)
 
         return response_text
 
     except Exception as e:
-        print(f"Groq completion error: {e}")
+        log_event(logging.ERROR, "completion_failed", error=str(e))
         await send_response(ctx, "I encountered an error processing your request.")
         return None
 
 
+async def run_tool_calls(ctx: commands.Context, tool_calls) -> list:
+    """Run one turn's tool calls, returning results in ``tool_calls`` order.
+
+    Consecutive independent calls run concurrently, at most
+    ``TOOL_CONCURRENCY`` at a time; a ``side_effect`` tool waits for the calls
+    before it and runs alone. A tool whose upstream bucket couldn't serve it
+    within its timeout fails straight away.
+    """
+    limit = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    async def run_one(tool_call):
+        tool = tool_registry.tools.get(tool_call.function.name)
+        timeout = tool.timeout if tool else TOOL_TIMEOUT
+        if (
+            tool
+            and tool.rate_bucket
+            and rate_limiter.delay("upstream", tool.rate_bucket) > timeout
+        ):
+            return f"Error: {tool.name} is rate limited right now, try again later"
+        async with limit:
+            start = time.monotonic()
+            try:
+                return await asyncio.wait_for(
+                    handle_tool_call(ctx, tool_call, send_directly=True),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                log_event(
+                    logging.WARNING, "tool_timeout", tool=tool_call.function.name
+                )
+                return f"Error: {tool_call.function.name} timed out"
+            finally:
+                tool_seconds.observe(
+                    time.monotonic() - start, tool=tool_call.function.name
+                )
+
+    results = []
+    batch = []
+    for tool_call in tool_calls:
+        tool = tool_registry.tools.get(tool_call.function.name)
+        if tool and tool.side_effect:
+            if batch:
+                results.extend(await asyncio.gather(*map(run_one, batch)))
+                batch = []
+            results.append(await run_one(tool_call))
+        else:
+            batch.append(tool_call)
+    if batch:
+        results.extend(await asyncio.gather(*map(run_one, batch)))
+    return results
+
+
 async def handle_tool_call(
     ctx: commands.Context,
     tool_call,
     send_directly: bool = False,
 ) -> str:
-    """Handle native tool calls from Groq."""
+    """Validate a native tool call from Groq and run its handler."""
     try:
-        tool_name = tool_call.function.name
-        tool_arguments = json.loads(tool_call.function.arguments)
-
-        print(f"Executing tool: {tool_name} with arguments: {tool_arguments}")
-
-        tool_actions = {
-            "cat": lambda: cat(ctx, from_tool_call=send_directly),
-            "dog": lambda: dog(ctx, from_tool_call=send_directly),
-            "gtn": lambda: gtn(ctx, from_tool_call=send_directly),
-            "dice": lambda: dice(
-                ctx,
-                sides=int(tool_arguments.get("sides", 6)),
-                from_tool_call=send_directly,
-            ),
-            "flip": lambda: flip(ctx, from_tool_call=send_directly),
-            "ask": lambda: ask(
-                ctx,
-                question=tool_arguments.get("question"),
-                from_tool_call=send_directly,
-            ),
-            "purge": lambda: purge(
-                ctx,
-                amount=int(tool_arguments.get("amount", 5)),
-                from_tool_call=send_directly,
-            ),
-            "calculate": lambda: calculate(
-                ctx, query=tool_arguments.get("query"), from_tool_call=send_directly
-            ),
-            "weather": lambda: weather(
-                ctx, city=tool_arguments.get("city"), from_tool_call=send_directly
-            ),
-            "gt": lambda: gt(ctx, from_tool_call=send_directly),
-            "whats_new": lambda: whats_new(ctx, from_tool_call=send_directly),
-            "meme": lambda: meme(ctx, from_tool_call=send_directly),
-            "crypto": lambda: crypto_price(
-                ctx,
-                symbol=tool_arguments.get("symbol"),
-                from_tool_call=send_directly,
-            ),
-            "serverinfo": lambda: server_info(ctx, from_tool_call=send_directly),
-            "userinfo": lambda: user_info(
-                ctx,
-                user=tool_arguments.get("user"),
-                from_tool_call=send_directly,
-            ),
-        }
+        tool = tool_registry.get(tool_call.function.name)
+        arguments = tool.parse(tool_call.function.arguments)
+
+        log_event(
+            logging.DEBUG,
+            "tool_call",
+            sample=LOG_TOOL_SAMPLE_RATE,
+            tool=tool.name,
+            arguments=tool_call.function.arguments[:200],
+        )
 
-        if tool_name not in tool_actions:
-            raise ValueError(f"Unknown tool: {tool_name}")
+        if tool.gateway and isinstance(ctx, RemoteContext):
+            return await ctx.call("tool", tool.name, tool_call.function.arguments)
 
-        result = await tool_actions[tool_name]()
-        return result
+        return await tool.handler(ctx, from_tool_call=send_directly, **arguments)
 
     except Exception as e:
-        print(f"Tool execution error: {e}")
+        log_event(
+            logging.WARNING,
+            "tool_failed",
+            tool=tool_call.function.name,
+            error=str(e),
+        )
         return f"Error: {str(e)}"
 
 
+def _pump(source, loop, dispatch):
+    """Hand messages from a process queue to ``dispatch`` on ``loop``."""
+    while True:
+        message = source.get()
+        loop.call_soon_threadsafe(dispatch, message)
+        if message is None:
+            return
+
+
+class RemoteContext:
+    """Stands in for a ``commands.Context`` inside a worker process.
+
+    Sends and ``gateway`` tool calls are forwarded to the gateway, which runs
+    them against the job's real context.
+    """
+
+    def __init__(self, worker: "ChatWorker", job_id: int):
+        self.worker = worker
+        self.job_id = job_id
+
+    def call(self, op: str, *args) -> asyncio.Future:
+        return self.worker.call(self.job_id, op, args)
+
+    async def reply(self, content):
+        await self.call("reply", content)
+
+    async def send(self, content):
+        await self.call("send", content)
+
+
+class RemoteReply:
+    """Worker-side handle on the gateway's ``StreamingReply`` for a job.
+
+    Deltas are buffered and forwarded at most once per ``interval`` seconds,
+    without waiting for the gateway.
+    """
+
+    def __init__(self, ctx: RemoteContext, interval: float = STREAM_EDIT_INTERVAL):
+        self.ctx = ctx
+        self.interval = interval
+        self._pending: list = []
+        self._flush_handle = None
+
+    def feed(self, delta: str):
+        self._pending.append(delta)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.interval, self._flush
+            )
+
+    def _flush(self):
+        self._flush_handle = None
+        if self._pending:
+            self._send("feed", "".join(self._pending))
+            self._pending.clear()
+
+    def _send(self, op: str, *args):
+        self.ctx.worker.call(self.ctx.job_id, op, args, wait=False)
+
+    def reset(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending.clear()
+        self._send("reset")
+
+
+class ChatWorker:
+    """Worker-process side of ``WorkerPool``: runs jobs on its own event loop."""
+
+    def __init__(self, index: int, jobs, results):
+        self.index = index
+        self.jobs = jobs
+        self.results = results
+        self.calls: dict = {}
+        self.call_ids = itertools.count()
+
+    def call(self, job_id: int, op: str, args: tuple, wait: bool = True):
+        call_id = next(self.call_ids) if wait else None
+        self.results.put(("call", self.index, job_id, call_id, op, args))
+        if wait:
+            future = asyncio.get_running_loop().create_future()
+            self.calls[call_id] = future
+            future.add_done_callback(
+                lambda future: future.cancelled() and self._cancel(job_id, call_id)
+            )
+            return future
+
+    def _cancel(self, job_id: int, call_id: int):
+        """Stop the gateway's side of a call nobody waits for any more."""
+        self.calls.pop(call_id, None)
+        self.results.put(("call", self.index, job_id, None, "cancel", (call_id,)))
+
+    async def run_job(self, job_id: int, job: dict):
+        request_id.set(job.pop("request_id"))
+        ctx = RemoteContext(self, job_id)
+        reply = RemoteReply(ctx) if job.pop("stream") else None
+        response = None
+        try:
+            response = await generate_chat_completion(ctx, reply=reply, **job)
+        finally:
+            self.results.put(("done", self.index, job_id, response))
+            self.results.put(("metrics", self.index, None, metrics.snapshot()))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+
+        def dispatch(message):
+            if message is None:
+                stopped.set_result(None)
+            elif message[0] == "job":
+                loop.create_task(self.run_job(*message[1:]))
+            elif message[0] == "reply":
+                _, call_id, error, value = message
+                future = self.calls.pop(call_id, None)
+                if future is None or future.done():
+                    return
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(value)
+            elif message[0] == "reset":
+                loop.create_task(conversation_memory.reset())
+
+        threading.Thread(
+            target=_pump, args=(self.jobs, loop, dispatch), daemon=True
+        ).start()
+        sweep_conversations.start()
+        flush_conversations.start()
+        log_event(logging.INFO, "worker_started", worker=self.index, pid=os.getpid())
+        await stopped
+        sweep_conversations.cancel()
+        flush_conversations.cancel()
+        await conversation_memory.backend.close()
+        await http_client.close()
+        await close_groq_client()
+
+
+def _worker_main(index: int, jobs, results):
+    asyncio.run(ChatWorker(index, jobs, results).run())
+    log_listener.stop()
+
+
+class WorkerPool:
+    """Runs ``generate_chat_completion`` in worker processes.
+
+    The gateway process keeps the Discord connection; workers send replies,
+    stream edits and ``gateway`` tool calls back to it over the results
+    queue. Each conversation is pinned to one worker so its memory, and the
+    rate limits keyed on it, live in a single process.
+    """
+
+    def __init__(self, processes: int):
+        self.context = multiprocessing.get_context("spawn")
+        self.size = processes
+        self.results = self.context.Queue()
+        self.workers: list = [None] * processes
+        self.jobs: dict = {}
+        self.job_ids = itertools.count()
+        self.stats = {"jobs": 0, "callbacks": 0, "restarts": 0}
+        self.calls: dict = {}
+        self._watcher = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        for index in range(self.size):
+            self._spawn(index)
+        threading.Thread(
+            target=_pump, args=(self.results, loop, self._dispatch), daemon=True
+        ).start()
+        self._watcher = loop.create_task(self._watch())
+
+    def _spawn(self, index: int):
+        jobs = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(index, jobs, self.results),
+            name=f"localbot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.workers[index] = (process, jobs)
+
+    def worker_for(self, context_key: str) -> int:
+        return zlib.crc32(context_key.encode()) % self.size
+
+    def in_flight(self) -> dict:
+        counts = dict.fromkeys(range(self.size), 0)
+        for job in self.jobs.values():
+            counts[job.index] += 1
+        return counts
+
+    def broadcast(self, kind: str):
+        for _, jobs in self.workers:
+            jobs.put((kind,))
+
+    async def submit(
+        self,
+        ctx: commands.Context,
+        server_id: Optional[str],
+        channel_id: str,
+        user_id: str,
+        prompt: str,
+        reply: Optional["StreamingReply"] = None,
+    ) -> Optional[str]:
+        """Same contract as ``generate_chat_completion``, run in a worker."""
+        index = self.worker_for(context_key_for(server_id, channel_id, user_id))
+        job_id = next(self.job_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.jobs[job_id] = SimpleNamespace(
+            index=index, future=future, ctx=ctx, reply=reply
+        )
+        self.stats["jobs"] += 1
+        job = dict(
+            server_id=server_id,
+            channel_id=channel_id,
+            user_id=user_id,
+            prompt=prompt,
+            stream=reply is not None,
+            request_id=request_id.get(),
+        )
+        self.workers[index][1].put(("job", job_id, job))
+        try:
+            return await future
+        finally:
+            del self.jobs[job_id]
+
+    def _dispatch(self, message):
+        if message is None:
+            return
+        kind, index, job_id, *rest = message
+        if kind == "metrics":
+            metrics.remote[index] = rest[0]
+            return
+        job = self.jobs.get(job_id)
+        if kind == "done":
+            if job and not job.future.done():
+                job.future.set_result(rest[0])
+            return
+        call_id, op, args = rest
+        if op == "cancel":
+            task = self.calls.pop((index, *args), None)
+            if task is not None:
+                task.cancel()
+            return
+        self.stats["callbacks"] += 1
+        task = asyncio.get_running_loop().create_task(
+            self._serve(index, job, call_id, op, args)
+        )
+        if call_id is not None:
+            # Kept so a worker whose call timed out (e.g. a gateway tool past
+            # its timeout) can cancel it instead of leaving it running.
+            key = (index, call_id)
+            self.calls[key] = task
+            task.add_done_callback(
+                lambda task: self.calls.get(key) is task and self.calls.pop(key)
+            )
+
+    async def _serve(self, index, job, call_id, op, args):
+        error = value = None
+        try:
+            if job is None:
+                raise RuntimeError("job is no longer running")
+            if op == "tool":
+                name, arguments = args
+                tool_call = SimpleNamespace(
+                    function=SimpleNamespace(name=name, arguments=arguments)
+                )
+                value = await handle_tool_call(job.ctx, tool_call, send_directly=True)
+            elif op == "feed":
+                job.reply.feed(*args)
+            elif op == "reset":
+                job.reply.reset()
+            elif op in ("reply", "send"):
+                await getattr(job.ctx, op)(*args)
+            else:
+                raise ValueError(f"Unknown call: {op}")
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if call_id is not None:
+            self.workers[index][1].put(("reply", call_id, error, value))
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(1.0)
+            for index, (process, _) in enumerate(self.workers):
+                if process.is_alive():
+                    continue
+                log_event(
+                    logging.ERROR,
+                    "worker_died",
+                    worker=index,
+                    exitcode=process.exitcode,
+                )
+                for job in self.jobs.values():
+                    if job.index == index and not job.future.done():
+                        job.future.set_result(None)
+                self.stats["restarts"] += 1
+                self._spawn(index)
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+        for _, jobs in self.workers:
+            jobs.put(None)
+        await asyncio.to_thread(self._join)
+        self.results.put(None)
+
+    def _join(self):
+        for process, _ in self.workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+worker_pool = WorkerPool(WORKER_PROCESSES) if WORKER_PROCESSES > 0 else None
+metrics.collected(
+    "localbot_worker_jobs",
+    "Chat jobs running, by worker process.",
+    lambda: worker_pool.in_flight() if worker_pool else {},
+    label="worker",
+)
+metrics.collected(
+    "localbot_worker_events_total",
+    "Worker pool jobs, gateway callbacks and worker restarts.",
+    lambda: worker_pool.stats if worker_pool else {},
+    type="counter",
+    label="event",
+)
+
+
 statuses = [
     "Ask me anything! 💭",
     "Weather forecasts 🌤️",
@@ -640,60 +2897,74 @@ async def change_status(bot):
     await bot.change_presence(activity=discord.Game(random.choice(statuses)))
 
 
-@bot.event
-async def on_ready():
-    print(f"{bot.user} is ready and online!")
-    change_status.start(bot)
+@tasks.loop(minutes=MEMORY_SWEEP_MINUTES)
+async def sweep_conversations():
+    removed = conversation_memory.sweep()
+    if removed:
+        log_event(
+            logging.INFO,
+            "memory_swept",
+            removed=removed,
+            kept=len(conversation_memory),
+        )
 
 
-@bot.event
-async def on_message(message):
-    if bot.user and bot.user.mentioned_in(message) and not message.author.bot:
-        ctx = await bot.get_context(message)
-        await chat(
-            ctx, message=message.content.replace(f"<@{bot.user.id}>", "").strip()
-        )
-    else:
-        await bot.process_commands(message)
+@tasks.loop(seconds=MEMORY_FLUSH_SECONDS)
+async def flush_conversations():
+    try:
+        await conversation_memory.backend.flush()
+    except Exception as e:
+        log_event(logging.ERROR, "memory_flush_failed", error=str(e))
 
 
-@bot.slash_command(description="Send a picture of a cat.")
+@tool(
+    "cat",
+    "Get a random picture of a cat.",
+    rate_bucket="api.thecatapi.com",
+    keywords=r"\b(?:cats?|kitt(?:y|en|ens|ies)|meow|cute|animals?|pets?)\b",
+)
+@discord.slash_command(description="Send a picture of a cat.")
 async def cat(ctx, from_tool_call=False):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            "https://api.thecatapi.com/v1/images/search"
-        ) as response:
-            if response.status == 200:
-                data = await response.json()
-                image_url = data[0]["url"]
-                if not from_tool_call:
-                    await send_response(ctx, image_url)
-                return image_url
-            else:
-                if not from_tool_call:
-                    await send_response(ctx, "Failed to fetch cat image.")
-                return "Failed to fetch cat image."
+    async with http_client.get(
+        "https://api.thecatapi.com/v1/images/search"
+    ) as response:
+        if response.status == 200:
+            data = await response.json()
+            image_url = data[0]["url"]
+            if not from_tool_call:
+                await send_response(ctx, image_url)
+            return image_url
+        else:
+            if not from_tool_call:
+                await send_response(ctx, "Failed to fetch cat image.")
+            return "Failed to fetch cat image."
 
 
-@bot.slash_command(description="Send a picture of a dog.")
+@tool(
+    "dog",
+    "Get a random picture of a dog.",
+    rate_bucket="api.thedogapi.com",
+    keywords=r"\b(?:dogs?|pupp(?:y|ies)|doggo|woof|cute|animals?|pets?)\b",
+)
+@discord.slash_command(description="Send a picture of a dog.")
 async def dog(ctx, from_tool_call=False):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            "https://api.thedogapi.com/v1/images/search"
-        ) as response:
-            if response.status == 200:
-                data = await response.json()
-                image_url = data[0]["url"]
-                if not from_tool_call:
-                    await send_response(ctx, image_url)
-                return image_url
-            else:
-                if not from_tool_call:
-                    await send_response(ctx, "Failed to fetch dog image.")
-                return "Failed to fetch dog image."
+    async with http_client.get(
+        "https://api.thedogapi.com/v1/images/search"
+    ) as response:
+        if response.status == 200:
+            data = await response.json()
+            image_url = data[0]["url"]
+            if not from_tool_call:
+                await send_response(ctx, image_url)
+            return image_url
+        else:
+            if not from_tool_call:
+                await send_response(ctx, "Failed to fetch dog image.")
+            return "Failed to fetch dog image."
 
 
-@bot.slash_command(description="Send a picture of GT.")
+@tool("gt", "Share a picture of GT.", cacheable=True, keywords=r"\bgt\b")
+@discord.slash_command(description="Send a picture of GT.")
 async def gt(ctx, from_tool_call=False):
     image_url = "https://imgur.com/a/HlM60jA"
     if not from_tool_call:
@@ -701,7 +2972,15 @@ async def gt(ctx, from_tool_call=False):
     return image_url
 
 
-@bot.slash_command(description="Game: Guess the number between 1 and 10.")
+# Waits on the user's next message, so it runs alone and on the gateway.
+@tool(
+    "gtn",
+    "Start a number guessing game (1-10).",
+    side_effect=True,
+    gateway=True,
+    keywords=r"\b(?:gtn|guess\w*|(?:number|guessing) game)\b",
+)
+@discord.slash_command(description="Game: Guess the number between 1 and 10.")
 async def gtn(ctx, from_tool_call=False):
     secret_number = random.randint(1, 10)
     if not from_tool_call:
@@ -711,7 +2990,7 @@ async def gtn(ctx, from_tool_call=False):
         return message.author == ctx.author and message.content.isdigit()
 
     try:
-        guess = await bot.wait_for("message", check=check, timeout=10.0)
+        guess = await ctx.bot.wait_for("message", check=check, timeout=10.0)
         guess_number = int(guess.content)
         if 1 <= guess_number <= 10:
             if guess_number == secret_number:
@@ -734,7 +3013,7 @@ async def gtn(ctx, from_tool_call=False):
         return "User timed out while guessing."
 
 
-@bot.slash_command(description="Tell the user hello.")
+@discord.slash_command(description="Tell the user hello.")
 async def hello(ctx, from_tool_call=False):
     message = f"Hello, {ctx.author.display_name}!"
     if not from_tool_call:
@@ -742,7 +3021,13 @@ async def hello(ctx, from_tool_call=False):
     return message
 
 
-@bot.slash_command(description="Roll a dice with the specified number of sides.")
+@tool(
+    "dice",
+    "Roll a dice with a specified number of sides.",
+    {"sides": ToolParam(int, "Number of sides (default 6).", default=6, minimum=1)},
+    keywords=r"\b(?:dice|die|roll\w*|d\d+)\b",
+)
+@discord.slash_command(description="Roll a dice with the specified number of sides.")
 async def dice(ctx, sides: int = 6, from_tool_call=False):
     result = random.randint(1, sides)
     message = f"You rolled a {result}."
@@ -751,7 +3036,8 @@ async def dice(ctx, sides: int = 6, from_tool_call=False):
     return f"Rolled a {result} on a {sides}-sided dice."
 
 
-@bot.slash_command(description="Flip a coin.")
+@tool("flip", "Flip a coin.", keywords=r"\b(?:flip\w*|coin ?toss|toss|heads|tails)\b")
+@discord.slash_command(description="Flip a coin.")
 async def flip(ctx, from_tool_call=False):
     result = random.choice(["Heads", "Tails"])
     message = f"The coin landed on: **{result}**"
@@ -760,7 +3046,13 @@ async def flip(ctx, from_tool_call=False):
     return f"Coin flip result: {result}"
 
 
-@bot.slash_command(description="Ask the bot a yes/no question.")
+@tool(
+    "ask",
+    "Ask a yes/no question.",
+    {"question": ToolParam(str, "The question to ask.")},
+    keywords=r"\b(?:yes or no|yes/no|should i|magic 8|8 ?ball)\b",
+)
+@discord.slash_command(description="Ask the bot a yes/no question.")
 async def ask(ctx, question: str, from_tool_call=False):
     result = random.choice(["Yes", "No", "Maybe", "Definitely", "Not likely"])
     message = f"Question: {question}\nAnswer: {result}"
@@ -769,89 +3061,436 @@ async def ask(ctx, question: str, from_tool_call=False):
     return message
 
 
-@bot.command(description="Chat with the bot.")
+@commands.command(description="Chat with the bot.")
 async def chat(ctx, *, message):
+    if request_id.get() is None:
+        request_id.set(uuid.uuid4().hex[:12])
     async with ctx.typing():
         try:
             server_id = str(ctx.guild.id) if ctx.guild else None
             channel_id = str(ctx.channel.id)
             user_id = str(ctx.author.id)
             username = ctx.author.display_name
+            log_event(
+                logging.DEBUG,
+                "chat_received",
+                guild=server_id,
+                channel=channel_id,
+                user=user_id,
+            )
+
+            # Checked before the scheduler so throttled mentions don't hold
+            # context locks or per-guild queue places.
+            shard = shard_for(server_id)
+            if not rate_limiter.allow("user", f"{shard}:{user_id}") or (
+                server_id and not rate_limiter.allow("guild", f"{shard}:{server_id}")
+            ):
+                await ctx.reply(
+                    "You're sending messages a bit fast! Give me a moment. ⏳"
+                )
+                return
 
             full_prompt = f"{username}: {message}"
+            reply = StreamingReply(ctx) if STREAM_RESPONSES else None
 
-            response = await generate_chat_completion(
-                ctx=ctx,
-                prompt=full_prompt,
-                server_id=server_id,
-                channel_id=channel_id,
-                user_id=user_id,
-            )
+            try:
+                async with chat_scheduler.slot(
+                    server_id or f"DM-{user_id}",
+                    context_key_for(server_id, channel_id, user_id),
+                ):
+                    complete = (
+                        worker_pool.submit if worker_pool else generate_chat_completion
+                    )
+                    response = await complete(
+                        ctx=ctx,
+                        prompt=full_prompt,
+                        server_id=server_id,
+                        channel_id=channel_id,
+                        user_id=user_id,
+                        reply=reply,
+                    )
+            except SchedulerFull:
+                await ctx.reply(
+                    "I'm handling a lot of messages here right now. "
+                    "Please try again in a moment! 🙏"
+                )
+                return
 
-            if response:
+            if response and reply is not None:
+                await reply.finish(response)
+            elif response:
                 await send_complete_response(ctx, response)
             else:
+                if reply is not None:
+                    await reply.discard()
                 await ctx.reply(
                     "I couldn't generate a response. Please try again later."
                 )
 
         except Exception as e:
-            print(f"Chat error: {e}")
+            log_event(logging.ERROR, "chat_failed", error=str(e))
             await ctx.reply(f"An error occurred: {e}")
 
 
+def split_response(response: str) -> list:
+    """Split a response into chunks that fit Discord's 2000-character limit."""
+    if len(response) <= 2000:
+        return [response]
+    chunks = []
+    while response:
+        split_at = (response[:2000].rfind("\n") + 1) or 2000
+        chunk, response = (
+            response[:split_at].strip(),
+            response[split_at:].strip(),
+        )
+        chunks.append(chunk)
+    return chunks
+
+
 async def send_complete_response(ctx, response):
     """Send a complete response, handling message size limits."""
-    if len(response) > 2000:
-        is_first_chunk = True
-        while response:
-            split_at = (response[:2000].rfind("\n") + 1) or 2000
-            chunk, response = (
-                response[:split_at].strip(),
-                response[split_at:].strip(),
-            )
-            if is_first_chunk:
-                await ctx.reply(chunk)
-                is_first_chunk = False
+    for index, chunk in enumerate(split_response(response)):
+        start = time.monotonic()
+        if index == 0:
+            await ctx.reply(chunk)
+        else:
+            await ctx.send(chunk)
+        discord_send_seconds.observe(time.monotonic() - start, kind="chat")
+
+
+class StreamingReply:
+    """A reply that is posted early and edited as more text streams in.
+
+    ``feed`` only records text; a background task does the Discord I/O,
+    at most one update per ``interval`` seconds to stay inside Discord's
+    edit rate limits, so slow edits never hold up reading the model's
+    stream. Text past 2000 characters rolls over into follow-up messages,
+    split the same way as ``send_complete_response``.
+    """
+
+    def __init__(self, ctx, interval: float = STREAM_EDIT_INTERVAL):
+        self.ctx = ctx
+        self.interval = interval
+        self.text = ""
+        self._messages: list = []
+        self._shown: list = []
+        self._changed = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def feed(self, delta: str):
+        self.text += delta
+        self._changed.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._edit_loop())
+
+    def reset(self):
+        """Start over, e.g. when falling back to another model."""
+        self.text = ""
+
+    async def finish(self, text: str):
+        """Show the final text, removing messages it no longer needs."""
+        self._stop()
+        self.text = text
+        async with self._lock:
+            needed = await self._sync()
+            for message in self._messages[needed:]:
+                await message.delete()
+            del self._messages[needed:], self._shown[needed:]
+
+    async def discard(self):
+        self._stop()
+        async with self._lock:
+            for message in self._messages:
+                await message.delete()
+            self._messages.clear()
+            self._shown.clear()
+
+    def _stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _edit_loop(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            # Shielded: a cancel between updates must not lose a posted message.
+            await asyncio.shield(self._background_sync())
+            await asyncio.sleep(self.interval)
+
+    async def _background_sync(self):
+        async with self._lock:
+            try:
+                await self._sync()
+            except Exception as e:
+                log_event(logging.WARNING, "stream_edit_failed", error=str(e))
+
+    async def _sync(self) -> int:
+        """Bring the posted messages up to date; returns how many are in use."""
+        chunks = [chunk for chunk in split_response(self.text) if chunk]
+        for index, chunk in enumerate(chunks):
+            if index < len(self._messages):
+                if self._shown[index] != chunk:
+                    await self._messages[index].edit(content=chunk)
+                    self._shown[index] = chunk
             else:
-                await ctx.send(chunk)
-    else:
-        await ctx.reply(response)
+                send = self.ctx.reply if index == 0 else self.ctx.send
+                self._messages.append(await send(chunk))
+                self._shown.append(chunk)
+        return len(chunks)
 
 
-@bot.slash_command(description="Delete a set number of messages.")
+# Discord refuses bulk deletes of messages older than 14 days.
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 60
+
+
+async def delete_one(message) -> bool:
+    """Delete one message, paced by the channel's ``delete`` bucket."""
+    key = str(message.channel.id)
+    for _ in range(3):
+        await rate_limiter.acquire("delete", key)
+        try:
+            await message.delete()
+            return True
+        except discord.NotFound:
+            return False
+        except discord.HTTPException as e:
+            if e.status != 429:
+                raise
+            rate_limiter.retry_after(
+                "delete", key, e.response.headers.get("Retry-After")
+            )
+    return False
+
+
+async def delete_messages(
+    channel, amount: int, check=None, before=None, progress=None
+) -> int:
+    """Delete up to ``amount`` messages matching ``check``; returns how many.
+
+    History is streamed newest first and stops as soon as ``amount`` matches
+    are found, or after ``DELETE_SCAN_LIMIT`` messages. In guild channels,
+    messages under 14 days old go out in bulk deletes of up to 100; older
+    ones, and everything in DMs, are deleted one at a time. ``progress`` is
+    awaited with the running total after every delete call.
+    """
+    if amount < 1:
+        return 0
+    bulk = getattr(channel, "guild", None) is not None and hasattr(
+        channel, "delete_messages"
+    )
+    cutoff = time.time() - BULK_DELETE_MAX_AGE
+    batch = []
+    matched = deleted = 0
+
+    async def report(count, method):
+        nonlocal deleted
+        deleted += count
+        deleted_messages.inc(count, method=method)
+        if progress is not None:
+            await progress(deleted)
+
+    async def flush():
+        if batch:
+            # Taken off first, so a failed batch is never retried.
+            messages = batch[:]
+            batch.clear()
+            await rate_limiter.acquire("delete", str(channel.id))
+            await channel.delete_messages(messages)
+            await report(len(messages), "bulk")
+
+    try:
+        async for message in channel.history(limit=DELETE_SCAN_LIMIT, before=before):
+            if check is not None and not check(message):
+                continue
+            matched += 1
+            if bulk and message.created_at.timestamp() > cutoff:
+                batch.append(message)
+                if len(batch) == 100:
+                    await flush()
+            elif await delete_one(message):
+                await report(1, "single")
+            if matched >= amount:
+                break
+        await flush()
+    except RateLimited as e:
+        log_event(logging.WARNING, "delete_rate_limited", error=str(e))
+    return deleted
+
+
+def deletion_progress(update, total: int, interval: float = STREAM_EDIT_INTERVAL):
+    """A ``progress`` callback that awaits ``update(text)`` at most every ``interval`` s."""
+    last = 0.0
+
+    async def report(deleted):
+        nonlocal last
+        now = time.monotonic()
+        if deleted < total and now - last >= interval:
+            last = now
+            await update(f"Deleting messages… {deleted}/{total}")
+
+    return report
+
+
+@tool(
+    "purge",
+    "Delete a specified number of messages.",
+    {
+        "amount": ToolParam(
+            int, "Number of messages to delete.", default=5, minimum=1, maximum=100
+        )
+    },
+    # 100 one-by-one deletes (DMs, or messages over 14 days old) take ~20s.
+    timeout=120,
+    side_effect=True,
+    gateway=True,
+    keywords=r"\b(?:purge|(?:delete|clear|clean up|remove) (?:\w+ ){0,3}(?:messages|msgs|chat))\b",
+)
+@discord.slash_command(description="Delete a set number of messages.")
 async def purge(ctx, amount: int, from_tool_call=False):
-    await ctx.channel.purge(limit=amount + 1)
+    try:
+        if from_tool_call:
+            # Keep the mention that asked for it; the bot still replies to it.
+            deleted = await delete_messages(ctx.channel, amount, before=ctx.message)
+        else:
+            await ctx.defer(ephemeral=True)
+            deleted = await delete_messages(
+                ctx.channel,
+                amount,
+                progress=deletion_progress(
+                    lambda text: ctx.edit(content=text), amount
+                ),
+            )
+    except discord.Forbidden:
+        message = "I don't have permission to delete messages here."
+        if not from_tool_call:
+            await send_response(ctx, message)
+        return message
     if not from_tool_call:
-        await send_response(ctx, f"Deleted {amount} messages.")
-    return f"Deleted {amount} messages."
+        await send_response(ctx, f"Deleted {deleted} messages.")
+    return f"Deleted {deleted} messages."
 
 
-@bot.command(description="Delete a set number of bot messages in DM")
+@commands.command(description="Delete a set number of bot messages in DM")
 async def clear(ctx, amount: int = 5):
     if isinstance(ctx.channel, discord.DMChannel):
-        messages = await ctx.channel.history(limit=amount).flatten()
-        bot_messages = [msg for msg in messages if msg.author == bot.user]
-        for msg in bot_messages:
-            await msg.delete()
-        confirmation_msg = await ctx.send(f"Deleted {len(bot_messages)} messages.")
+        status = await ctx.send("Deleting messages…")
+        deleted = await delete_messages(
+            ctx.channel,
+            amount,
+            check=lambda msg: msg.author == ctx.bot.user,
+            before=status,
+            progress=deletion_progress(
+                lambda text: status.edit(content=text), amount
+            ),
+        )
+        await status.edit(content=f"Deleted {deleted} messages.")
         await asyncio.sleep(5)
-        await confirmation_msg.delete()
+        await status.delete()
     else:
         await send_response(ctx, "This command can only be used in direct messages.")
 
 
-@bot.command(description="Clear the conversation history.")
+@commands.command(description="Clear the conversation history.")
 async def clear_history(ctx):
     if ctx.author.id == 471320666075824134:
-        global conversation_memory
-        conversation_memory.clear()
+        await conversation_memory.reset()
+        if worker_pool:
+            worker_pool.broadcast("reset")
         await ctx.send("Conversation history cleared.")
     else:
         await ctx.send("You do not have permission to clear the conversation history.")
 
 
-@bot.command(description="Pin a replied message.")
+@commands.command(name="stats", description="Show bot cache statistics.")
+async def bot_stats(ctx):
+    # Counts read through ``metrics`` include the worker processes.
+    conversations = metrics.totals("localbot_conversations", "shard")
+    lines = [
+        f"**shard {shard}**: latency {latency * 1000:.0f} ms, "
+        f"{conversations.get(shard, 0)} conversations"
+        for shard, latency in shard_latencies().items()
+    ]
+    lines += [
+        f"**conversations** ({sum(conversations.values())} stored): "
+        + ", ".join(
+            f"{key} {value}"
+            for key, value in metrics.totals(
+                "localbot_conversation_evictions_total", "reason"
+            ).items()
+        )
+    ]
+    if worker_pool:
+        # Each worker routes on its own model health.
+        circuits = metrics.totals("localbot_model_circuit_open", "model")
+        lines += [
+            f"**{model}**: circuit open in {circuits.get(model, 0)} "
+            f"of {worker_pool.size} workers"
+            for model in model_router.models
+        ]
+    else:
+        lines += [
+            f"**{model}** ({health.state}): error rate {health.error_rate:.0%}, "
+            f"p95 {health.p95:.2f}s"
+            for model, health in model_router.health.items()
+        ]
+    lines.append(
+        "**rate limits**: "
+        + ", ".join(
+            f"{key} {value}"
+            for key, value in metrics.totals("localbot_rate_limit_total", "event").items()
+        )
+    )
+    lines.append(
+        f"**chat queue**: {chat_scheduler.depth} waiting, "
+        f"{chat_scheduler.active} running, "
+        f"p95 wait {chat_scheduler.wait_p95():.2f}s, "
+        + ", ".join(f"{key} {value}" for key, value in chat_scheduler.stats.items())
+    )
+    if worker_pool:
+        lines.append(
+            "**workers**: "
+            + ", ".join(
+                f"#{index} {count} running"
+                for index, count in worker_pool.in_flight().items()
+            )
+            + ", "
+            + ", ".join(f"{key} {value}" for key, value in worker_pool.stats.items())
+        )
+    lines.append(
+        "**routing**: "
+        + ", ".join(
+            f"{key} {value}"
+            for key, value in metrics.totals(
+                "localbot_model_routing_total", "decision"
+            ).items()
+        )
+    )
+    if chat_cache is not None:
+        stats = metrics.totals("localbot_chat_cache_total", "event")
+        cached = metrics.totals("localbot_chat_cache_entries").get(None, 0)
+        hits = stats.get("hits", 0) + stats.get("similar_hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        hit_rate = hits / lookups if lookups else 0
+        lines.append(
+            f"**chat cache** ({cached} cached, {hit_rate:.0%} hit rate): "
+            + ", ".join(f"{key} {value}" for key, value in stats.items())
+        )
+    cached = metrics.totals("localbot_cache_entries", "cache")
+    events = {
+        event: metrics.totals(f"localbot_cache_{event}_total", "cache")
+        for event in ("hits", "misses", "coalesced", "evictions")
+    }
+    lines += [
+        f"**{name}** ({cached.get(name, 0)} cached): "
+        + ", ".join(f"{event} {counts.get(name, 0)}" for event, counts in events.items())
+        for name in response_caches
+    ]
+    await ctx.send("\n".join(lines))
+
+
+@commands.command(description="Pin a replied message.")
 async def pin(ctx):
     if ctx.message.reference:
         referenced_message = await ctx.channel.fetch_message(
@@ -863,80 +3502,102 @@ async def pin(ctx):
         await ctx.send("Please reply to the message you want to pin.")
 
 
+async def fetch_weather(city: str) -> Optional[dict]:
+    """Fetch current conditions for a city, or None if it isn't known."""
+    weather_url = (
+        f"https://api.openweathermap.org/data/2.5/weather?"
+        f"q={city}&units=metric&appid={WEATHER_API_KEY}"
+    )
+
+    async with http_client.get(weather_url) as response:
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise Exception(f"Weather API error: {response.status}")
+        return await response.json()
+
+
+@tool(
+    "weather",
+    "Get current weather statistics for a specific city.",
+    {"city": ToolParam(str, "The name of the city.")},
+    rate_bucket="api.openweathermap.org",
+    keywords=(
+        r"\b(?:weather|forecast|temperature|rain\w*|snow\w*|sunny|humid\w*"
+        r"|windy|cloudy|umbrella|how (?:hot|cold|warm|chilly))\b"
+    ),
+)
 async def weather(ctx, city: str, from_tool_call: bool = False) -> str:
     """Get current weather for a city using OpenWeatherMap API."""
     try:
-
-        weather_url = (
-            f"https://api.openweathermap.org/data/2.5/weather?"
-            f"q={city}&units=metric&appid={WEATHER_API_KEY}"
+        data = await weather_cache.get_or_fetch(
+            " ".join(city.split()).casefold(), lambda: fetch_weather(city)
+        )
+        if data is None:
+            error_msg = f"Could not find city: {city}"
+            if not from_tool_call:
+                await send_response(ctx, error_msg)
+            return error_msg
+
+        temp = data["main"]["temp"]
+        feels_like = data["main"]["feels_like"]
+        humidity = data["main"]["humidity"]
+        wind_speed = data["wind"]["speed"]
+        weather_desc = data["weather"][0]["description"]
+        pressure = data["main"]["pressure"]
+
+        location_name = f"{data['name']}, {data['sys']['country']}"
+
+        weather_id = data["weather"][0]["id"]
+        weather_emoji = "🌈"  # default
+        if weather_id < 300:
+            weather_emoji = "⛈️"  # thunderstorm
+        elif weather_id < 400:
+            weather_emoji = "🌧️"  # drizzle
+        elif weather_id < 500:
+            weather_emoji = "🌧️"  # rain
+        elif weather_id < 600:
+            weather_emoji = "🌨️"  # snow
+        elif weather_id < 800:
+            weather_emoji = "🌫️"  # atmosphere
+        elif weather_id == 800:
+            weather_emoji = "☀️"  # clear
+        elif weather_id <= 804:
+            weather_emoji = "☁️"  # clouds
+
+        response = (
+            f"{weather_emoji} Weather in **{location_name}**:\n"
+            f"🌡️ Temperature: {temp:.1f}°C\n"
+            f"🤔 Feels like: {feels_like:.1f}°C\n"
+            f"💧 Humidity: {humidity}%\n"
+            f"💨 Wind speed: {wind_speed} m/s\n"
+            f"🌍 Pressure: {pressure} hPa\n"
+            f"☁️ Conditions: {weather_desc.capitalize()}"
         )
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(weather_url) as response:
-                if response.status != 200:
-                    if response.status == 404:
-                        error_msg = f"Could not find city: {city}"
-                        if not from_tool_call:
-                            await send_response(ctx, error_msg)
-                        return error_msg
-                    raise Exception(f"Weather API error: {response.status}")
-
-                data = await response.json()
-
-                temp = data["main"]["temp"]
-                feels_like = data["main"]["feels_like"]
-                humidity = data["main"]["humidity"]
-                wind_speed = data["wind"]["speed"]
-                weather_desc = data["weather"][0]["description"]
-                pressure = data["main"]["pressure"]
-
-                location_name = f"{data['name']}, {data['sys']['country']}"
-
-                weather_id = data["weather"][0]["id"]
-                weather_emoji = "🌈"  # default
-                if weather_id < 300:
-                    weather_emoji = "⛈️"  # thunderstorm
-                elif weather_id < 400:
-                    weather_emoji = "🌧️"  # drizzle
-                elif weather_id < 500:
-                    weather_emoji = "🌧️"  # rain
-                elif weather_id < 600:
-                    weather_emoji = "🌨️"  # snow
-                elif weather_id < 800:
-                    weather_emoji = "🌫️"  # atmosphere
-                elif weather_id == 800:
-                    weather_emoji = "☀️"  # clear
-                elif weather_id <= 804:
-                    weather_emoji = "☁️"  # clouds
-
-                response = (
-                    f"{weather_emoji} Weather in **{location_name}**:\n"
-                    f"🌡️ Temperature: {temp:.1f}°C\n"
-                    f"🤔 Feels like: {feels_like:.1f}°C\n"
-                    f"💧 Humidity: {humidity}%\n"
-                    f"💨 Wind speed: {wind_speed} m/s\n"
-                    f"🌍 Pressure: {pressure} hPa\n"
-                    f"☁️ Conditions: {weather_desc.capitalize()}"
-                )
-
-                if not from_tool_call:
-                    await send_response(ctx, response)
-                return response
+        if not from_tool_call:
+            await send_response(ctx, response)
+        return response
 
     except Exception as e:
         error_msg = f"Error fetching weather: {str(e)}"
-        print(error_msg)
+        log_event(logging.WARNING, "weather_failed", city=city, error=str(e))
         if not from_tool_call:
             await send_response(ctx, "Sorry, I couldn't fetch the weather information.")
         return error_msg
 
 
-@bot.slash_command(description="Get current weather for a city.")
+@discord.slash_command(description="Get current weather for a city.")
 async def getweather(ctx, *, city: str):
     await weather(ctx, city)
 
 
+@tool(
+    "whats_new",
+    "Show recent bot updates.",
+    cacheable=True,
+    keywords=r"\b(?:what'?s new|new features?|updates?|changelog|release notes|version)\b",
+)
 async def whats_new(ctx, from_tool_call=False):
     """Read the whatsnew.md file and tell users what's new."""
     try:
@@ -966,51 +3627,154 @@ async def whats_new(ctx, from_tool_call=False):
         return error_message
 
 
+MEME_SUBREDDITS = [
+    "memes",
+    "dankmemes",
+    "me_irl",
+    "wholesomememes",
+    "funny",
+    "ProgrammerHumor",
+    "PrequelMemes",
+    "terriblefacebookmemes",
+]
+
+
+class MemePool:
+    """Prefetched image posts per subreddit, served from memory.
+
+    Each pool is a rotating buffer of at most ``size`` posts. ``refresh``
+    loads a subreddit's hot listing and adds the image posts it hasn't
+    queued before, pushing the oldest out; ``take`` serves the newest
+    queued post, the hottest of the latest refresh first. Nothing repeats
+    until it has dropped out of the last ``history`` posts seen.
+    """
+
+    def __init__(
+        self, subreddits: list, size: int = MEME_POOL_SIZE, history: int = 1000
+    ):
+        self.pools = {name: deque(maxlen=size) for name in subreddits}
+        self._seen = {name: OrderedDict() for name in subreddits}
+        self.history = history
+        self.stats = {"served": 0, "live_fetches": 0, "refreshes": 0, "failures": 0}
+
+    def __len__(self):
+        return sum(map(len, self.pools.values()))
+
+    def take(self, subreddit: Optional[str] = None) -> Optional[dict]:
+        if subreddit is None:
+            stocked = [name for name, pool in self.pools.items() if pool]
+            if not stocked:
+                return None
+            subreddit = random.choice(stocked)
+        pool = self.pools[subreddit]
+        if not pool:
+            return None
+        self.stats["served"] += 1
+        return pool.pop()
+
+    async def refresh(self, subreddit: str) -> int:
+        """Queue new image posts from ``subreddit``; returns how many."""
+        async with http_client.get(
+            f"https://www.reddit.com/r/{subreddit}/hot.json?limit=50",
+            headers={"User-Agent": "LocalBot/1.0"},
+        ) as response:
+            # Reddit reports its own window; stop early instead of hitting 429s.
+            remaining = response.headers.get("X-Ratelimit-Remaining")
+            if remaining is not None and float(remaining) < 1:
+                rate_limiter.retry_after(
+                    "upstream",
+                    "www.reddit.com",
+                    response.headers.get("X-Ratelimit-Reset"),
+                )
+            if response.status != 200:
+                raise UpstreamError(response.status)
+            data = await response.json()
+        self.stats["refreshes"] += 1
+
+        seen = self._seen[subreddit]
+        posts = []
+        for post in data.get("data", {}).get("children", []):
+            post_data = post["data"]
+            if not post_data.get("url", "").endswith(
+                (".jpg", ".png", ".gif", ".jpeg")
+            ) or post_data.get("over_18", False):
+                continue
+            post_id = post_data.get("id") or post_data["url"]
+            if post_id in seen:
+                continue
+            seen[post_id] = None
+            if len(seen) > self.history:
+                seen.popitem(last=False)
+            posts.append(
+                {
+                    "title": post_data.get("title", "No title"),
+                    "url": post_data["url"],
+                    "ups": post_data.get("ups", 0),
+                }
+            )
+        # Listings are hottest first; the hottest should end up served first.
+        self.pools[subreddit].extend(reversed(posts))
+        return len(posts)
+
+    async def refresh_all(self):
+        for subreddit in self.pools:
+            try:
+                await self.refresh(subreddit)
+            except Exception as e:
+                self.stats["failures"] += 1
+                log_event(
+                    logging.WARNING,
+                    "meme_refresh_failed",
+                    subreddit=subreddit,
+                    error=str(e),
+                )
+
+
+meme_pool = MemePool(MEME_SUBREDDITS)
+metrics.collected(
+    "localbot_meme_pool_posts",
+    "Prefetched meme posts waiting to be served, by subreddit.",
+    lambda: {name: len(pool) for name, pool in meme_pool.pools.items()},
+    label="subreddit",
+)
+metrics.collected(
+    "localbot_meme_pool_total",
+    "Meme pool posts served, live fetches, refreshes and refresh failures.",
+    lambda: meme_pool.stats,
+    type="counter",
+    label="event",
+)
+
+
+@tasks.loop(minutes=MEME_REFRESH_MINUTES)
+async def refresh_memes():
+    await meme_pool.refresh_all()
+
+
+@tool(
+    "meme",
+    "Get a random meme from Reddit.",
+    # Served from the gateway's pool, so only one process prefetches.
+    gateway=True,
+    rate_bucket="www.reddit.com",
+    keywords=r"\b(?:memes?|dank|reddit|funny (?:pic|picture|image)s?)\b",
+)
 async def meme(ctx, from_tool_call=False):
     """Get a random meme from Reddit."""
     try:
-        subreddits = [
-            "memes",
-            "dankmemes",
-            "me_irl",
-            "wholesomememes",
-            "funny",
-            "ProgrammerHumor",
-            "PrequelMemes",
-            "terriblefacebookmemes",
-        ]
-        subreddit = random.choice(subreddits)
-
-        async with aiohttp.ClientSession() as session:
-            # Try to get a meme from the subreddit's hot posts
-            async with session.get(
-                f"https://www.reddit.com/r/{subreddit}/hot.json?limit=50",
-                headers={"User-Agent": "LocalBot/1.0"},
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    posts = data.get("data", {}).get("children", [])
-
-                    # Filter for image posts
-                    image_posts = [
-                        post
-                        for post in posts
-                        if post["data"]
-                        .get("url", "")
-                        .endswith((".jpg", ".png", ".gif", ".jpeg"))
-                        and not post["data"].get("over_18", False)
-                    ]
-
-                    if image_posts:
-                        post_data = random.choice(image_posts)["data"]
-                        title = post_data.get("title", "No title")
-                        url = post_data.get("url", "")
-                        ups = post_data.get("ups", 0)
-
-                        message = f"**{title}** 👍 {ups}\n{url}"
-                        if not from_tool_call:
-                            await send_response(ctx, message)
-                        return message
+        post = meme_pool.take()
+        if post is None:
+            # Nothing prefetched yet: fetch one subreddit now and keep the rest.
+            subreddit = random.choice(MEME_SUBREDDITS)
+            meme_pool.stats["live_fetches"] += 1
+            await meme_pool.refresh(subreddit)
+            post = meme_pool.take(subreddit)
+
+        if post:
+            message = f"**{post['title']}** 👍 {post['ups']}\n{post['url']}"
+            if not from_tool_call:
+                await send_response(ctx, message)
+            return message
 
         # Fallback
         message = "Couldn't fetch a meme right now. Try again! 😅"
@@ -1019,89 +3783,261 @@ async def meme(ctx, from_tool_call=False):
         return message
     except Exception as e:
         error_msg = f"Error fetching meme: {str(e)}"
-        print(f"Meme fetch error: {error_msg}")
+        log_event(logging.WARNING, "meme_failed", error=str(e))
         if not from_tool_call:
             await send_response(ctx, "Failed to fetch a meme. Try again!")
         return error_msg
 
 
-@bot.slash_command(description="Get a random meme.")
+@discord.slash_command(description="Get a random meme.")
 async def getmeme(ctx):
     await meme(ctx)
 
 
-async def crypto_price(ctx, symbol: str, from_tool_call=False):
-    """Get cryptocurrency price."""
+# Tickers shared by many coins on CoinGecko resolve to these ids.
+PREFERRED_COINS = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "USDT": "tether",
+    "BNB": "binancecoin",
+    "SOL": "solana",
+    "USDC": "usd-coin",
+    "XRP": "ripple",
+    "DOGE": "dogecoin",
+    "ADA": "cardano",
+    "TRX": "tron",
+    "AVAX": "avalanche-2",
+    "SHIB": "shiba-inu",
+    "DOT": "polkadot",
+    "MATIC": "matic-network",
+    "LTC": "litecoin",
+    "DAI": "dai",
+    "LINK": "chainlink",
+    "UNI": "uniswap",
+}
+_DERIVATIVE_COIN = re.compile(r"wrapped|bridged|peg|wormhole", re.IGNORECASE)
+
+
+class CoinIndex:
+    """Symbol, id and name lookups over CoinGecko's coin list.
+
+    When several coins share a ticker, ``PREFERRED_COINS`` decides; failing
+    that, native coins win over wrapped/bridged/pegged ones and shorter ids
+    over longer ones.
+    """
+
+    def __init__(self, preferred: dict):
+        self.preferred = preferred
+        self.by_symbol: dict = {}
+        self.by_name: dict = {}
+        self.ids: set = set()
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _rank(coin_id: str) -> tuple:
+        return (bool(_DERIVATIVE_COIN.search(coin_id)), len(coin_id), coin_id)
+
+    def load(self, coins: list):
+        by_symbol: dict = {}
+        by_name: dict = {}
+        for coin in coins:
+            coin_id = coin["id"]
+            for table, key in (
+                (by_symbol, coin.get("symbol", "").upper()),
+                (by_name, coin.get("name", "").lower()),
+            ):
+                current = table.get(key)
+                if current is None or self._rank(coin_id) < self._rank(current):
+                    table[key] = coin_id
+        by_symbol.update(self.preferred)
+        self.by_symbol, self.by_name = by_symbol, by_name
+        self.ids = {coin["id"] for coin in coins}
+        self.loaded_at = time.time()
+
+    def lookup(self, query: str) -> str:
+        """CoinGecko id for a ticker, id or name; unknown queries pass through.
+
+        Preferred tickers come first, then exact ids and names; other coins'
+        tickers only match short queries, since some tickers ("BITCOIN")
+        collide with another coin's id.
+        """
+        key = query.lower()
+        return (
+            self.preferred.get(query.upper())
+            or (key if key in self.ids else None)
+            or self.by_name.get(key)
+            or (self.by_symbol.get(query.upper()) if len(query) <= 8 else None)
+            or key
+        )
+
+    async def refresh(self):
+        async with http_client.get(
+            "https://api.coingecko.com/api/v3/coins/list"
+        ) as response:
+            if response.status != 200:
+                raise UpstreamError(response.status)
+            coins = await response.json()
+        self.load(coins)
+
+
+class PriceBatcher:
+    """Coalesces price lookups into multi-id ``simple/price`` requests.
+
+    Ids requested within ``window`` seconds of the first pending one (or
+    until ``max_ids`` are pending) are fetched together.
+    """
+
+    def __init__(self, window: float, max_ids: int = 100):
+        self.window = window
+        self.max_ids = max_ids
+        self._pending: dict = {}
+        self._timer = None
+        self.stats = {"requests": 0, "lookups": 0}
+
+    async def get(self, coin_id: str) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        future = self._pending.get(coin_id)
+        if future is None:
+            future = self._pending[coin_id] = loop.create_future()
+            if len(self._pending) >= self.max_ids:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        self.stats["lookups"] += 1
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        asyncio.get_running_loop().create_task(self._fetch(batch))
+
+    async def _fetch(self, batch: dict):
+        self.stats["requests"] += 1
+        try:
+            prices = await fetch_coin_prices(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for coin_id, future in batch.items():
+            if not future.done():
+                future.set_result(prices.get(coin_id))
+
+
+async def fetch_coin_prices(coin_ids: list) -> dict:
+    """Fetch USD price data for several CoinGecko ids in one request."""
+    async with http_client.get(
+        "https://api.coingecko.com/api/v3/simple/price",
+        params={
+            "ids": ",".join(coin_ids),
+            "vs_currencies": "usd",
+            "include_24hr_change": "true",
+            "include_market_cap": "true",
+        },
+    ) as response:
+        if response.status != 200:
+            raise UpstreamError(response.status)
+        return await response.json()
+
+
+coin_index = CoinIndex(PREFERRED_COINS)
+price_batcher = PriceBatcher(COIN_BATCH_WINDOW)
+metrics.collected(
+    "localbot_coin_index_size", "Coins in the CoinGecko symbol index.", lambda: len(coin_index)
+)
+metrics.collected(
+    "localbot_coin_price_total",
+    "Coin price lookups and the simple/price requests that served them.",
+    lambda: price_batcher.stats,
+    type="counter",
+    label="event",
+)
+
+
+@tasks.loop(hours=COIN_INDEX_REFRESH_HOURS)
+async def refresh_coin_index():
     try:
-        symbol_upper = symbol.upper()
-
-        # Map common symbols to CoinGecko IDs
-        symbol_map = {
-            "BTC": "bitcoin",
-            "ETH": "ethereum",
-            "USDT": "tether",
-            "BNB": "binancecoin",
-            "SOL": "solana",
-            "USDC": "usd-coin",
-            "XRP": "ripple",
-            "DOGE": "dogecoin",
-            "ADA": "cardano",
-            "TRX": "tron",
-            "AVAX": "avalanche-2",
-            "SHIB": "shiba-inu",
-            "DOT": "polkadot",
-            "MATIC": "matic-network",
-            "LTC": "litecoin",
-            "DAI": "dai",
-            "LINK": "chainlink",
-            "UNI": "uniswap",
-        }
+        await coin_index.refresh()
+        log_event(logging.INFO, "coin_index_loaded", coins=len(coin_index))
+    except Exception as e:
+        log_event(logging.WARNING, "coin_index_failed", error=str(e))
 
-        coin_id = symbol_map.get(symbol_upper, symbol.lower())
-
-        async with aiohttp.ClientSession() as session:
-            # Try CoinGecko API (more reliable)
-            async with session.get(
-                f"https://api.coingecko.com/api/v3/simple/price?ids={coin_id}&vs_currencies=usd&include_24hr_change=true&include_market_cap=true"
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if coin_id in data:
-                        coin_data = data[coin_id]
-                        price = coin_data.get("usd", 0)
-                        change_24h = coin_data.get("usd_24h_change", 0)
-                        market_cap = coin_data.get("usd_market_cap", 0)
-
-                        # Format numbers
-                        if price >= 1000:
-                            price_str = f"${price:,.0f}"
-                        elif price >= 1:
-                            price_str = f"${price:,.2f}"
-                        else:
-                            price_str = f"${price:.6f}"
-
-                        if market_cap > 1e9:
-                            market_cap_str = f"${market_cap/1e9:.2f}B"
-                        elif market_cap > 1e6:
-                            market_cap_str = f"${market_cap/1e6:.2f}M"
-                        else:
-                            market_cap_str = f"${market_cap:,.0f}"
-
-                        change_emoji = "📈" if change_24h > 0 else "📉"
-                        change_sign = "+" if change_24h > 0 else ""
-
-                        message = (
-                            f"💰 **{symbol_upper}**\n"
-                            f"💵 Price: {price_str}\n"
-                            f"{change_emoji} 24h Change: {change_sign}{change_24h:.2f}%\n"
-                            f"📊 Market Cap: {market_cap_str}"
-                        )
 
-                        if not from_tool_call:
-                            await send_response(ctx, message)
-                        return message
+def format_coin_price(symbol: str, coin_data: dict) -> str:
+    price = coin_data.get("usd", 0)
+    change_24h = coin_data.get("usd_24h_change") or 0
+    market_cap = coin_data.get("usd_market_cap") or 0
+
+    # Format numbers
+    if price >= 1000:
+        price_str = f"${price:,.0f}"
+    elif price >= 1:
+        price_str = f"${price:,.2f}"
+    else:
+        price_str = f"${price:.6f}"
+
+    if market_cap > 1e9:
+        market_cap_str = f"${market_cap/1e9:.2f}B"
+    elif market_cap > 1e6:
+        market_cap_str = f"${market_cap/1e6:.2f}M"
+    else:
+        market_cap_str = f"${market_cap:,.0f}"
+
+    change_emoji = "📈" if change_24h > 0 else "📉"
+    change_sign = "+" if change_24h > 0 else ""
+
+    return (
+        f"💰 **{symbol}**\n"
+        f"💵 Price: {price_str}\n"
+        f"{change_emoji} 24h Change: {change_sign}{change_24h:.2f}%\n"
+        f"📊 Market Cap: {market_cap_str}"
+    )
+
+
+@tool(
+    "crypto",
+    "Get the current price for one or more cryptocurrencies.",
+    {
+        "symbol": ToolParam(
+            str, "One or more crypto symbols (e.g. BTC, or BTC, ETH, SOL)."
+        )
+    },
+    # Uses the gateway's coin index and price batcher, so only one process
+    # downloads the coin list and price lookups batch across workers.
+    gateway=True,
+    rate_bucket="api.coingecko.com",
+    keywords=(
+        r"\b(?:crypto\w*|bitcoin|btc|eth|ethereum|solana|sol|doge\w*|xrp|ripple"
+        r"|usdt|usdc|bnb|cardano|litecoin|ltc|shib|altcoins?|coin prices?|tokens?)\b"
+    ),
+)
+async def crypto_price(ctx, symbol: str, from_tool_call=False):
+    """Get cryptocurrency prices for one or more symbols ("BTC ETH, SOL")."""
+    try:
+        # Commas separate names with spaces in them ("the graph, btc").
+        parts = symbol.split(",") if "," in symbol else symbol.split()
+        symbols = list(dict.fromkeys(" ".join(part.split()).upper() for part in parts))
+        symbols = [part for part in symbols if part][:10]
+
+        async def price_of(symbol_upper):
+            coin_id = coin_index.lookup(symbol_upper)
+            coin_data = await crypto_cache.get_or_fetch(
+                coin_id, lambda: price_batcher.get(coin_id)
+            )
+            if coin_data is not None:
+                return format_coin_price(symbol_upper, coin_data)
+            return f"Couldn't find price for {symbol_upper}. Try BTC, ETH, SOL, or other popular cryptocurrencies."
+
+        message = "\n\n".join(await asyncio.gather(*map(price_of, symbols)))
+        if not message:
+            message = "Please give a crypto symbol such as BTC or ETH."
 
-        message = f"Couldn't find price for {symbol_upper}. Try BTC, ETH, SOL, or other popular cryptocurrencies."
         if not from_tool_call:
             await send_response(ctx, message)
         return message
@@ -1112,11 +4048,17 @@ async def crypto_price(ctx, symbol: str, from_tool_call=False):
         return error_msg
 
 
-@bot.slash_command(description="Get cryptocurrency price.")
-async def crypto(ctx, *, symbol: str):
-    await crypto_price(ctx, symbol)
+@discord.slash_command(description="Get cryptocurrency prices.")
+async def crypto(ctx, *, symbols: str):
+    await crypto_price(ctx, symbols)
 
 
+@tool(
+    "serverinfo",
+    "Get information about the current server.",
+    gateway=True,
+    keywords=r"\b(?:server|guild|member count|boosts?)\b",
+)
 async def server_info(ctx, from_tool_call=False):
     """Display server information."""
     try:
@@ -1169,11 +4111,21 @@ async def server_info(ctx, from_tool_call=False):
         return error_msg
 
 
-@bot.slash_command(description="Display server information.")
+@discord.slash_command(description="Display server information.")
 async def serverinfo(ctx):
     await server_info(ctx)
 
 
+@tool(
+    "userinfo",
+    "Get information about a user.",
+    {"user": ToolParam(str, "The user mention or ID (optional).", default=None)},
+    gateway=True,
+    keywords=(
+        r"\b(?:user ?info|who am i|my (?:account|profile|roles?|avatar)|profile"
+        r"|account age|joined|roles?)\b|<@!?\d+>"
+    ),
+)
 async def user_info(ctx, user: Optional[str] = None, from_tool_call=False):
     """Display user information."""
     try:
@@ -1227,9 +4179,61 @@ async def user_info(ctx, user: Optional[str] = None, from_tool_call=False):
         return error_msg
 
 
-@bot.slash_command(description="Display user information.")
+@discord.slash_command(description="Display user information.")
 async def userinfo(ctx, user: Optional[discord.Member] = None):
     await user_info(ctx, str(user.id) if user else None)
 
 
-bot.run(TOKEN)
+PREFIX_COMMANDS = [chat, clear, clear_history, bot_stats, pin]
+SLASH_COMMANDS = [
+    cat,
+    dog,
+    gt,
+    gtn,
+    hello,
+    dice,
+    flip,
+    ask,
+    purge,
+    getweather,
+    getmeme,
+    crypto,
+    serverinfo,
+    userinfo,
+]
+
+
+def create_bot(**options) -> commands.Bot:
+    """Build the Discord client with LocalBot's commands registered.
+
+    ``options`` are passed through to the client class, which is the sharded
+    one when ``AUTO_SHARD`` or ``SHARD_COUNT`` is set.
+    """
+    global bot
+    # Python 3.14 removed implicit event loop creation in asyncio.get_event_loop().
+    # py-cord 2.6.1 still relies on it during Bot.__init__, so we create one explicitly.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    options.setdefault("guild_ready_timeout", GUILD_READY_TIMEOUT)
+    client_class = LocalBotClient
+    if AUTO_SHARD or SHARD_COUNT:
+        client_class = ShardedLocalBotClient
+        options.setdefault("shard_count", SHARD_COUNT or None)
+        options.setdefault("shard_ids", parse_shard_ids(SHARD_IDS))
+    bot = client_class(command_prefix="$", intents=intents, **options)
+    for command in PREFIX_COMMANDS:
+        bot.add_command(command)
+    for command in SLASH_COMMANDS:
+        bot.add_application_command(command)
+    return bot
+
+
+def main():
+    create_bot().run(TOKEN)
+
+
+if __name__ == "__main__":
+    main()
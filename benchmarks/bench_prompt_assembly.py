@@ -0,0 +1,69 @@
+"""Micro-benchmark: prompt assembly per chat call.
+
+Compares the old per-call rebuild (fresh dicts, ``hasattr`` checks and a
+``list(messages)`` copy per model in ``models_to_try``) with the memory's
+incrementally maintained ``prompt`` list.
+
+    python benchmarks/bench_prompt_assembly.py --calls 200000
+"""
+
+import argparse, json, os, sys, timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import LocalBot
+
+MODELS = ["openai/gpt-oss-120b", "openai/gpt-oss-20b"]
+
+
+def rebuild(memory, prompt):
+    messages = [{"role": "system", "content": LocalBot.system_prompt}]
+    for msg in memory.chat_memory.messages:
+        if hasattr(msg, "content"):
+            role = "user" if msg.type == "human" else "assistant"
+            messages.append({"role": role, "content": msg.content})
+    messages.append({"role": "user", "content": prompt})
+    for _ in MODELS:
+        curr_messages = list(messages)
+    return curr_messages
+
+
+def incremental(memory, prompt):
+    messages = memory.chat_memory.prompt + [{"role": "user", "content": prompt}]
+    base_length = len(messages)
+    for _ in MODELS:
+        del messages[base_length:]
+        curr_messages = messages
+    return curr_messages
+
+
+def main(args):
+    memory = LocalBot.ConversationBufferWindowMemory(
+        k=args.k, system_message=LocalBot.SYSTEM_MESSAGE
+    )
+    for i in range(args.k):
+        memory.chat_memory.add_user_message(f"user{i}: question number {i}")
+        memory.chat_memory.add_ai_message(f"answer number {i} " * 10)
+    assert rebuild(memory, "hi") == incremental(memory, "hi")
+
+    report = {"history_messages": len(memory.chat_memory.messages)}
+    for name, fn in (("rebuild", rebuild), ("incremental", incremental)):
+        seconds = min(
+            timeit.repeat(lambda: fn(memory, "user: hi"), number=args.calls, repeat=3)
+        )
+        report[name] = {
+            "us_per_call": round(seconds / args.calls * 1e6, 3),
+            "calls_per_s": round(args.calls / seconds),
+        }
+    report["speedup"] = round(
+        report["rebuild"]["us_per_call"] / report["incremental"]["us_per_call"], 1
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--k", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,205 @@
+"""Startup benchmark: import time and time-to-``on_ready`` on a mocked gateway.
+
+Each run is a fresh interpreter that imports ``LocalBot``, builds the client
+with ``create_bot()`` and connects it to a local fake Discord REST API and
+gateway (HELLO, IDENTIFY, READY with no guilds, command sync), then waits
+for the Groq client that ``on_ready`` builds in the background. Reports the
+median of ``--runs`` runs.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse, asyncio, json, os, socket, statistics, subprocess, sys, threading, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USER = {
+    "id": "100000000000000001",
+    "username": "LocalBot",
+    "discriminator": "0",
+    "avatar": None,
+    "bot": True,
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_discord(port):
+    """Serve the REST routes and gateway session login needs, from a thread."""
+    from aiohttp import WSMsgType, web
+
+    gateway_url = f"ws://127.0.0.1:{port}/ws"
+
+    def reply(data):
+        # py-cord only decodes bodies whose content type is exactly this.
+        return web.Response(
+            body=json.dumps(data).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def me(request):
+        return reply(USER)
+
+    async def gateway(request):
+        return reply(
+            {
+                "url": gateway_url,
+                "shards": 1,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    async def list_commands(request):
+        return reply([])
+
+    async def put_commands(request):
+        commands = await request.json()
+        for index, command in enumerate(commands, 1):
+            command.setdefault("type", 1)
+            command.update(id=str(index), application_id=USER["id"], version="1")
+        return reply(commands)
+
+    async def websocket(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": 41250}})
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                break
+            payload = json.loads(message.data)
+            if payload["op"] == 1:
+                await ws.send_json({"op": 11})
+            elif payload["op"] == 2:
+                await ws.send_json(
+                    {
+                        "op": 0,
+                        "t": "READY",
+                        "s": 1,
+                        "d": {
+                            "v": 10,
+                            "user": USER,
+                            "guilds": [],
+                            "session_id": "bench",
+                            "resume_gateway_url": gateway_url,
+                            "application": {"id": USER["id"], "flags": 0},
+                        },
+                    }
+                )
+        return ws
+
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        app = web.Application()
+        app.router.add_get("/api/v10/users/@me", me)
+        app.router.add_get("/api/v10/gateway", gateway)
+        app.router.add_get("/api/v10/gateway/bot", gateway)
+        app.router.add_get("/api/v10/applications/{app}/commands", list_commands)
+        app.router.add_put("/api/v10/applications/{app}/commands", put_commands)
+        app.router.add_get("/ws", websocket)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+def child():
+    """One measured startup; prints a JSON line of timings in milliseconds."""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import LocalBot
+
+    imported = time.perf_counter()
+    bot = LocalBot.create_bot()
+    created = time.perf_counter()
+
+    import discord.http
+
+    port = _free_port()
+    start_fake_discord(port)
+    discord.http.Route.base = property(lambda route: f"http://127.0.0.1:{port}/api/v10")
+
+    async def connect():
+        ready = asyncio.Event()
+
+        async def on_ready():
+            ready.set()
+
+        bot.add_listener(on_ready, "on_ready")
+        begin = time.perf_counter()
+        runner = asyncio.create_task(bot.start("bench-token"))
+        await asyncio.wait_for(ready.wait(), timeout=30)
+        ready_at = time.perf_counter()
+        # on_ready builds the deferred Groq client in a thread.
+        while LocalBot._groq_client is None:
+            await asyncio.sleep(0.005)
+        warmed_at = time.perf_counter()
+        await bot.close()
+        await runner
+        return ready_at - begin, warmed_at - ready_at
+
+    to_ready, to_groq = asyncio.run(connect())
+
+    print(
+        json.dumps(
+            {
+                "import_ms": (imported - start) * 1000,
+                "create_bot_ms": (created - imported) * 1000,
+                "connect_to_ready_ms": to_ready * 1000,
+                "ready_to_groq_client_ms": to_groq * 1000,
+            }
+        )
+    )
+
+
+def main(args):
+    env = dict(
+        os.environ,
+        GROQ_API_KEY="bench",
+        METRICS_PORT="0",
+        LOG_LEVEL="ERROR",
+        GUILD_READY_TIMEOUT=str(args.guild_ready_timeout),
+    )
+    runs = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, __file__, "--child"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process_ms"] = (time.perf_counter() - start) * 1000
+        runs.append(result)
+    report = {
+        key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]
+    }
+    report["runs"] = args.runs
+    report["guild_ready_timeout_s"] = args.guild_ready_timeout
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--guild-ready-timeout", type=float, default=2.0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    child() if args.child else main(args)
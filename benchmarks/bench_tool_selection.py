@@ -0,0 +1,105 @@
+"""Offline benchmark: keyword tool selection and compact system prompts.
+
+Runs every prompt in a labelled corpus through ``select_tools`` and compares
+the input size of each request (system prompt + tool schemas + prompt) with
+the all-tools, full-prompt baseline. Reports token savings per system prompt
+variant, tool-selection recall, how often small talk goes out with no tools,
+and the selection cost per prompt.
+
+    python benchmarks/bench_tool_selection.py --verbose
+"""
+
+import argparse, json, os, sys, timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import LocalBot
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_selection_corpus.jsonl")
+
+
+def load_corpus(path):
+    with open(path) as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def memory_with(previous):
+    memory = LocalBot.ConversationBufferWindowMemory(
+        k=5, system_message=LocalBot.SYSTEM_MESSAGE
+    )
+    if previous:
+        memory.chat_memory.add_user_message(f"user: {previous}")
+        memory.chat_memory.add_ai_message("ok")
+    return memory
+
+
+def request_tokens(system_message, tools, prompt):
+    tokens = LocalBot.estimate_tokens(system_message["content"])
+    tokens += LocalBot.estimate_tokens(prompt)
+    if tools:
+        tokens += LocalBot.estimate_tokens(json.dumps(tools))
+    return tokens
+
+
+def main(args):
+    LocalBot.TOOL_SELECTION = "keyword"
+    all_names = [schema["function"]["name"] for schema in LocalBot.TOOLS]
+    baseline_message = LocalBot.SYSTEM_MESSAGES[("full", True)]
+
+    expected_total = found_total = tools_sent = 0
+    small_talk = small_talk_clean = 0
+    baseline_tokens = 0
+    variant_tokens = {"full": 0, "compact": 0}
+    misses = []
+    for entry in load_corpus(args.corpus):
+        memory = memory_with(entry.get("previous"))
+        selected = LocalBot.select_tools(entry["prompt"], memory)
+        names = {schema["function"]["name"] for schema in selected}
+        expected = set(all_names if entry["tools"] == "all" else entry["tools"])
+
+        expected_total += len(expected)
+        found_total += len(expected & names)
+        tools_sent += len(names)
+        if not expected:
+            small_talk += 1
+            small_talk_clean += not names
+        if expected - names:
+            misses.append({"prompt": entry["prompt"], "missing": sorted(expected - names)})
+
+        baseline_tokens += request_tokens(baseline_message, LocalBot.TOOLS, entry["prompt"])
+        for variant in variant_tokens:
+            message = LocalBot.SYSTEM_MESSAGES[(variant, bool(selected))]
+            variant_tokens[variant] += request_tokens(message, selected, entry["prompt"])
+
+    count = len(load_corpus(args.corpus))
+    memory = memory_with("what's the weather in London")
+    seconds = min(
+        timeit.repeat(
+            lambda: LocalBot.select_tools("price of btc and a cat picture", memory),
+            number=args.calls,
+            repeat=3,
+        )
+    )
+    report = {
+        "prompts": count,
+        "recall": round(found_total / expected_total, 3),
+        "small_talk_without_tools": f"{small_talk_clean}/{small_talk}",
+        "avg_tools_sent": round(tools_sent / count, 2),
+        "baseline_avg_input_tokens": round(baseline_tokens / count),
+        "selection_us_per_prompt": round(seconds / args.calls * 1e6, 2),
+    }
+    for variant, tokens in variant_tokens.items():
+        report[f"{variant}_avg_input_tokens"] = round(tokens / count)
+        report[f"{variant}_token_savings"] = f"{1 - tokens / baseline_tokens:.0%}"
+    if args.verbose:
+        report["misses"] = misses
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--verbose", action="store_true")
+    main(parser.parse_args())
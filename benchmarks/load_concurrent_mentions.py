@@ -0,0 +1,147 @@
+"""Load test: N concurrent mentions against a local fake completion server.
+
+Runs the real ``generate_chat_completion`` path twice, once with the old
+blocking call pattern (sync Groq client awaited from the coroutine) and once
+with the async backend, and reports wall time and the worst event-loop stall.
+
+    python benchmarks/load_concurrent_mentions.py --mentions 50 --latency 0.2
+"""
+
+import argparse, asyncio, json, os, socket, sys, threading, time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_completion_server(port, latency):
+    """Serve OpenAI-style chat completions from a background thread."""
+
+    async def completions(request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response(
+            {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "pong"},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 1,
+                    "completion_tokens": 1,
+                    "total_tokens": 2,
+                },
+            }
+        )
+
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        app = web.Application()
+        app.router.add_post("/openai/v1/chat/completions", completions)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+class FakeContext:
+    """Just enough of a commands.Context for generate_chat_completion."""
+
+    async def reply(self, message):
+        return message
+
+    send = reply
+
+
+async def _loop_lag_probe(stop, interval=0.01):
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_round(LocalBot, mentions):
+    LocalBot.conversation_memory.clear()
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_loop_lag_probe(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            LocalBot.generate_chat_completion(
+                ctx=FakeContext(),
+                server_id=str(i),
+                channel_id=str(i),
+                user_id=str(i),
+                prompt=f"user{i}: ping",
+            )
+            for i in range(mentions)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_stall = await probe
+    ok = sum(1 for r in results if r == "pong")
+    return elapsed, worst_stall, ok
+
+
+async def main(args):
+    port = _free_port()
+    start_fake_completion_server(port, args.latency)
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("GROQ_MAX_CONCURRENCY", str(args.mentions))
+    os.environ.setdefault("RATE_LIMIT_GROQ", "1000000/1")
+
+    import LocalBot
+    from groq import Groq
+
+    async_backend = LocalBot.create_completion
+    sync_client = Groq(api_key="bench", base_url=os.environ["GROQ_BASE_URL"])
+
+    async def blocking_backend(started=None, **kwargs):
+        # The pre-async code path: a synchronous HTTP call inside a coroutine.
+        return sync_client.chat.completions.create(**kwargs)
+
+    report = {}
+    for label, backend in (("blocking", blocking_backend), ("async", async_backend)):
+        LocalBot.create_completion = backend
+        elapsed, stall, ok = await run_round(LocalBot, args.mentions)
+        report[label] = {
+            "wall_s": round(elapsed, 3),
+            "throughput_rps": round(args.mentions / elapsed, 1),
+            "worst_loop_stall_ms": round(stall * 1000, 1),
+            "ok": ok,
+        }
+    LocalBot.create_completion = async_backend
+    report["speedup"] = round(report["blocking"]["wall_s"] / report["async"]["wall_s"], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mentions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,496 @@
+"""Offline replay: a JSONL corpus of mentions through the real chat pipeline.
+
+Each row (``guild``/``channel``/``user``/``name``/``text``; ``guild`` null for
+DMs) is fed to the ``chat`` command with fake Discord objects, so it runs
+``chat`` -> ``generate_chat_completion`` -> ``run_tool_calls`` ->
+``handle_tool_call`` unchanged. One local mock server plays both Groq and
+the tool upstreams (via ``HTTP_UPSTREAM_OVERRIDE``) with configurable
+latency and error injection. The mock model calls whichever tools the
+registry's keyword selection picks for a mention, up to ``--max-fanout``.
+
+Reports throughput, p50/p95/p99 latency, tool fan-out and memory growth.
+
+    python benchmarks/replay.py --concurrency 16 --repeat 5 --error-rate 0.05
+"""
+
+import argparse, asyncio, contextvars, json, os, random, re, socket, sys, threading
+import time, tracemalloc, uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_CORPUS = os.path.join(ROOT, "benchmarks", "replay_corpus.jsonl")
+FAILURES = {
+    "error": ("I encountered an error", "I couldn't generate", "An error occurred"),
+    "throttled": ("You're sending messages a bit fast", "I'm handling a lot of messages"),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class MockServer:
+    """Groq chat completions plus tool upstreams, served from a background thread."""
+
+    def __init__(self, port, args, registry):
+        self.port = port
+        self.args = args
+        self.registry = registry
+        self.random = random.Random(args.seed)
+        self.stats = {
+            "completions": 0,
+            "completion_errors": 0,
+            "upstream": {},
+            "upstream_errors": 0,
+        }
+
+    async def _delay(self, latency):
+        await asyncio.sleep(latency + self.random.uniform(0, self.args.jitter))
+
+    def _inject(self, rate):
+        return self.random.random() < rate
+
+    def _arguments(self, schema, text):
+        arguments = {}
+        for name, spec in schema["function"]["parameters"]["properties"].items():
+            if spec["type"] == "integer":
+                number = re.search(r"\d+", text)
+                if number:
+                    arguments[name] = int(number.group())
+            else:
+                tail = re.split(r"\b(?:in|for|of|is)\s+", text)[-1]
+                arguments[name] = tail.strip(" ?!.") or text
+        return arguments
+
+    def _choose(self, body):
+        """Tool calls for a user turn: the offered tools selection would pick."""
+        offered = {schema["function"]["name"]: schema for schema in body.get("tools", [])}
+        text = body["messages"][-1]["content"].partition(": ")[2]
+        selected = self.registry.select(text)
+        if not offered or len(selected) == len(self.registry.schemas):
+            return []
+        calls = []
+        for schema in selected[: self.args.max_fanout]:
+            name = schema["function"]["name"]
+            if name in offered:
+                calls.append(
+                    {
+                        "id": f"call_{uuid.uuid4().hex[:8]}",
+                        "type": "function",
+                        "function": {
+                            "name": name,
+                            "arguments": json.dumps(self._arguments(offered[name], text)),
+                        },
+                    }
+                )
+        return calls
+
+    def _answer(self, body):
+        last = body["messages"][-1]
+        if last["role"] == "tool":
+            results = [
+                json.loads(message["content"])["result"]
+                for message in body["messages"]
+                if isinstance(message, dict) and message.get("role") == "tool"
+            ]
+            return "Here's what I found:\n" + "\n".join(str(r)[:200] for r in results), []
+        calls = self._choose(body)
+        if calls:
+            return None, calls
+        return " ".join(["word"] * self.args.reply_words), []
+
+    async def completions(self, request):
+        body = await request.json()
+        self.stats["completions"] += 1
+        await self._delay(self.args.latency)
+        if self._inject(self.args.error_rate):
+            self.stats["completion_errors"] += 1
+            return web.json_response(
+                {"error": {"message": "injected failure", "type": "server_error"}},
+                status=self.args.error_status,
+            )
+        content, calls = self._answer(body)
+        if body.get("stream"):
+            return await self._stream(request, body, content, calls)
+        message = {"role": "assistant", "content": content}
+        if calls:
+            message["tool_calls"] = calls
+        return web.json_response(
+            {
+                "id": "chatcmpl-replay",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "tool_calls" if calls else "stop",
+                        "message": message,
+                    }
+                ],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+        )
+
+    async def _stream(self, request, body, content, calls):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def emit(delta, finish_reason=None):
+            chunk = {
+                "id": "chatcmpl-replay",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        if calls:
+            await emit(
+                {
+                    "role": "assistant",
+                    "tool_calls": [dict(call, index=i) for i, call in enumerate(calls)],
+                }
+            )
+        else:
+            for word in content.split(" "):
+                await emit({"content": word + " "})
+        await emit({}, "tool_calls" if calls else "stop")
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def upstream(self, request):
+        host = request.match_info["host"]
+        upstream = self.stats["upstream"]
+        upstream[host] = upstream.get(host, 0) + 1
+        await self._delay(self.args.tool_latency)
+        if self._inject(self.args.tool_error_rate):
+            self.stats["upstream_errors"] += 1
+            return web.json_response({"error": "injected failure"}, status=503)
+        path = request.match_info["path"]
+        query = request.query
+
+        if host in ("api.thecatapi.com", "api.thedogapi.com"):
+            return web.json_response([{"url": f"https://cdn.example/{uuid.uuid4().hex}.jpg"}])
+        if host == "www.wolframalpha.com":
+            return web.Response(
+                text=f"Query:\n\"{query.get('input', '')}\"\n\nResult:\n42\n\n"
+                "Wolfram|Alpha website result for \"42\":\nhttps://www.wolframalpha.com/"
+            )
+        if host == "api.openweathermap.org":
+            return web.json_response(
+                {
+                    "name": query.get("q", "Nowhere").title(),
+                    "sys": {"country": "XX"},
+                    "main": {"temp": 21.5, "feels_like": 21.0, "humidity": 60, "pressure": 1013},
+                    "wind": {"speed": 3.2},
+                    "weather": [{"id": 800, "description": "clear sky"}],
+                }
+            )
+        if host == "api.coingecko.com" and path.endswith("coins/list"):
+            return web.json_response(
+                [{"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"}]
+            )
+        if host == "api.coingecko.com":
+            return web.json_response(
+                {
+                    coin: {"usd": 1234.5, "usd_24h_change": 1.5, "usd_market_cap": 2.5e10}
+                    for coin in query.get("ids", "").split(",")
+                    if coin
+                }
+            )
+        if host == "www.reddit.com":
+            return web.json_response(
+                {
+                    "data": {
+                        "children": [
+                            {
+                                "data": {
+                                    "id": uuid.uuid4().hex[:6],
+                                    "title": "replay meme",
+                                    "url": f"https://i.example/{uuid.uuid4().hex}.png",
+                                    "ups": 100,
+                                }
+                            }
+                            for _ in range(25)
+                        ]
+                    }
+                }
+            )
+        return web.json_response({"error": "not mocked"}, status=404)
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            app = web.Application()
+            app.router.add_post("/openai/v1/chat/completions", self.completions)
+            app.router.add_get("/{host}/{path:.*}", self.upstream)
+            runner = web.AppRunner(app)
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", self.port).start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+
+
+class FakeMessage:
+    def __init__(self, content=None, embed=None, embeds=None):
+        self.content = content
+        self.embeds = embeds or ([embed] if embed else [])
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.deleted = 0
+
+    async def _history(self):
+        return
+        yield
+
+    def history(self, limit=100, before=None, **kwargs):
+        return self._history()
+
+    async def delete_messages(self, messages):
+        self.deleted += len(messages)
+
+
+class FakeBot:
+    async def wait_for(self, event, check=None, timeout=None):
+        return SimpleNamespace(content=str(random.randint(1, 10)))
+
+
+class FakeContext:
+    """Enough of a commands.Context for ``chat`` and every tool handler."""
+
+    bot = FakeBot()
+
+    def __init__(self, row):
+        now = datetime.now(timezone.utc)
+        self.author = SimpleNamespace(
+            id=row["user"],
+            name=row["name"],
+            display_name=row["name"],
+            discriminator="0",
+            mention=f"<@{row['user']}>",
+            created_at=now,
+            display_avatar=SimpleNamespace(url="https://cdn.example/avatar.png"),
+        )
+        self.guild = row.get("guild") and SimpleNamespace(
+            id=row["guild"],
+            name=f"guild-{row['guild']}",
+            text_channels=[],
+            voice_channels=[],
+            categories=[],
+            roles=[],
+            emojis=[],
+            member_count=42,
+            premium_tier=0,
+            premium_subscription_count=0,
+            created_at=now,
+            owner=None,
+        )
+        self.channel = FakeChannel(row["channel"])
+        self.message = SimpleNamespace(mentions=[], reference=None)
+        self.sent = []
+
+    def typing(self):
+        return _NoTyping()
+
+    async def reply(self, content=None, **kwargs):
+        message = FakeMessage(content, kwargs.get("embed"), kwargs.get("embeds"))
+        self.sent.append(message)
+        return message
+
+    send = reply
+
+
+class _NoTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def outcome(ctx):
+    text = " ".join(m.content for m in ctx.sent if m.content)
+    for kind, markers in FAILURES.items():
+        if any(marker in text for marker in markers):
+            return kind
+    return "ok" if ctx.sent else "silent"
+
+
+def load_corpus(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+async def replay(LocalBot, rows, concurrency):
+    """Replay ``rows`` with at most ``concurrency`` mentions in flight."""
+    calls = contextvars.ContextVar("tool_calls")
+    real_handle_tool_call = LocalBot.handle_tool_call
+
+    async def counting_handle_tool_call(ctx, tool_call, send_directly=False):
+        calls.get().append(tool_call.function.name)
+        return await real_handle_tool_call(ctx, tool_call, send_directly=send_directly)
+
+    LocalBot.handle_tool_call = counting_handle_tool_call
+    limit = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(row):
+        async with limit:
+            ctx = FakeContext(row)
+            calls.set([])
+            start = time.perf_counter()
+            await LocalBot.chat(ctx, message=row["text"])
+            results.append((time.perf_counter() - start, outcome(ctx), calls.get()))
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(asyncio.create_task(one(row)) for row in rows))
+    finally:
+        LocalBot.handle_tool_call = real_handle_tool_call
+    return time.perf_counter() - start, results
+
+
+async def main(args):
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    os.environ["GROQ_API_KEY"] = "replay"
+    os.environ["GROQ_BASE_URL"] = base
+    os.environ["HTTP_UPSTREAM_OVERRIDE"] = base
+    os.environ["WEATHER_API_KEY"] = os.environ["WOLF"] = "replay"
+    # Replays run in-process; the worker pool only starts with the bot.
+    os.environ["WORKER_PROCESSES"] = "0"
+    # The replay measures the pipeline, not the limits; export these to override.
+    for name in (
+        "RATE_LIMIT_USER",
+        "RATE_LIMIT_GUILD",
+        "RATE_LIMIT_GROQ",
+        "RATE_LIMIT_WOLFRAM",
+        "RATE_LIMIT_WEATHER",
+        "RATE_LIMIT_COINGECKO",
+        "RATE_LIMIT_REDDIT",
+        "RATE_LIMIT_CATAPI",
+        "RATE_LIMIT_DOGAPI",
+    ):
+        os.environ.setdefault(name, "1000000/1")
+    os.environ.setdefault("TOOL_SELECTION", "keyword")
+
+    import LocalBot
+
+    # The bot logs JSON to stdout too; keep the report the only output by default.
+    LocalBot.log.setLevel(args.log_level)
+    server = MockServer(port, args, LocalBot.tool_registry)
+    server.start()
+    corpus = load_corpus(args.corpus)
+    rows = corpus * args.repeat
+
+    LocalBot.get_groq_client()
+    if args.warmup:
+        await replay(LocalBot, corpus[: args.warmup], args.concurrency)
+        LocalBot.conversation_memory.clear()
+    if args.trace_memory:
+        tracemalloc.start()
+    traced_start = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+    contexts_start = len(LocalBot.conversation_memory)
+
+    wall, results = await replay(LocalBot, rows, args.concurrency)
+
+    latencies = [latency for latency, _, _ in results]
+    fanout = [len(names) for _, _, names in results]
+    outcomes, by_tool = {}, {}
+    for _, kind, names in results:
+        outcomes[kind] = outcomes.get(kind, 0) + 1
+        for name in names:
+            by_tool[name] = by_tool.get(name, 0) + 1
+
+    report = {
+        "mentions": len(results),
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_mps": round(len(results) / wall, 1),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 1),
+            "p95": round(_percentile(latencies, 95) * 1000, 1),
+            "p99": round(_percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+        },
+        "outcomes": outcomes,
+        "tools": {
+            "calls": sum(fanout),
+            "mentions_with_tools": sum(1 for n in fanout if n),
+            "fanout_mean": round(sum(fanout) / len(fanout), 2),
+            "fanout_max": max(fanout),
+            "by_tool": dict(sorted(by_tool.items(), key=lambda item: -item[1])),
+        },
+        "mock": {
+            "completions": server.stats["completions"],
+            "completion_errors": server.stats["completion_errors"],
+            "upstream": server.stats["upstream"],
+            "upstream_errors": server.stats["upstream_errors"],
+        },
+    }
+    if args.trace_memory:
+        traced_end, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["memory"] = {
+            "growth_kb": round((traced_end - traced_start) / 1024, 1),
+            "peak_kb": round((traced_peak - traced_start) / 1024, 1),
+            "growth_per_mention_b": round((traced_end - traced_start) / len(results)),
+            "contexts": len(LocalBot.conversation_memory) - contexts_start,
+        }
+
+    await LocalBot.http_client.close()
+    await LocalBot.close_groq_client()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tool-latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--tool-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-fanout", type=int, default=3)
+    parser.add_argument("--reply-words", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument(
+        "--trace-memory", action=argparse.BooleanOptionalAction, default=True
+    )
+    asyncio.run(main(parser.parse_args()))